@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from typing import Any, Callable
+
+from python_run import client
+from python_run.hook import Hook
+from python_run.permission import Permission, PermissionName, Permissions
+from python_run.utils import parse_address
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+Result = dict[str, Any]
+
+
+def timeit(func: Callable[[], Any], number: int, repeat: int = 5) -> float:
+    # Returns the best time per call, in seconds
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+
+    return best / number
+
+
+def result(name: str, value: float, unit: str, **params: Any) -> Result:
+    return {"name": name, "params": params, "value": value, "unit": unit}
+
+
+def bench_hook_events(number: int) -> list[Result]:
+    permissions = Permissions()
+    permissions.allow_read("/tmp")
+    permissions.allow_env("HOME")
+    permissions.allow_net("127.0.0.1")
+    permissions.allow_run("/bin/ls")
+    permissions.allow_run("ls")
+
+    hook = Hook("", permissions)
+
+    events: dict[str, tuple[Any, ...]] = {
+        "exec": (None,),
+        "object.__getattr__": (None, "name"),
+        "import": ("os", None, [], [], []),
+        "open": ("/tmp/file", "r", 0),
+        "os.getenv": ("HOME",),
+        "socket.connect": (None, ("127.0.0.1", 80)),
+        "os.exec": ("/bin/ls", ["ls"], None),
+        "subprocess.Popen": ("ls", ["ls"], None, None),
+    }
+
+    results = []
+
+    for event, args in events.items():
+        if event == "import":
+            # Keeps the pending imports counter from growing
+            def func() -> None:
+                hook(event, args)
+                hook._thread.imports = 0
+
+        else:
+
+            def func() -> None:
+                hook(event, args)
+
+        results.append(
+            result("hook_events", 1 / timeit(func, number), "events/s", event=event)
+        )
+
+    return results
+
+
+def bench_check_latency(sizes: list[int], number: int) -> list[Result]:
+    results = []
+
+    for size in sizes:
+        permissions = Permissions()
+
+        for i in range(size):
+            permissions.allow_read(f"/data/dir{i}")
+            permissions.allow_net(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}")
+            permissions.allow_net(f"host{i}.example.com")
+
+        hit = f"/data/dir{size - 1}/file.txt"
+        miss = "/data/other/file.txt"
+
+        for name, func in {
+            "check_read_hit": lambda: permissions.check_read(hit),
+            "check_read_miss": lambda: permissions.check_read(miss),
+            "check_net_ip_hit": lambda: permissions.check_net("10.0.0.1:443"),
+            "check_net_miss": lambda: permissions.check_net("11.0.0.1:443"),
+            "check_cached": lambda: permissions.check(
+                Permission(PermissionName.READ, hit)
+            ),
+        }.items():
+            results.append(
+                result(name, timeit(func, number) * 1e9, "ns", allowlist=size)
+            )
+
+    return results
+
+
+def bench_parse_address(number: int) -> list[Result]:
+    results = []
+
+    for address in ["127.0.0.1", "github.com:443", "[::1]:8080"]:
+        latency = timeit(lambda: parse_address(address), number)
+        results.append(result("parse_address", latency * 1e9, "ns", address=address))
+
+    return results
+
+
+ENVIRON_CODE = """
+import json, os, sys, time
+
+if sys.argv[1] != "plain":
+    from python_run.hook import Hook, add_filtered_os_environ, add_os_getenv_audit
+    from python_run.permission import Permissions
+
+    permissions = Permissions()
+    permissions.allow_env("HOME")
+
+    if sys.argv[1] == "filtered":
+        add_filtered_os_environ(permissions)
+    else:
+        add_os_getenv_audit()
+
+    sys.addaudithook(Hook("", permissions))
+
+number = int(sys.argv[2])
+best = float("inf")
+
+for _ in range(5):
+    start = time.perf_counter()
+    for _ in range(number):
+        os.environ["HOME"]
+    best = min(best, time.perf_counter() - start)
+
+print(json.dumps(best / number))
+"""
+
+
+def bench_environ(number: int) -> list[Result]:
+    results = []
+
+    for mode in ["plain", "patched", "filtered"]:
+        out = subprocess.check_output(
+            [sys.executable, "-c", ENVIRON_CODE, mode, str(number)],
+            cwd=ROOT,
+            env={**os.environ, "HOME": os.environ.get("HOME", "/")},
+        )
+        results.append(
+            result("environ_getitem", json.loads(out) * 1e9, "ns", mode=mode)
+        )
+
+    return results
+
+
+SCRIPT = """
+import json, os, tempfile
+
+for _ in range(100):
+    with open(__file__) as fp:
+        fp.read()
+
+os.environ.get("HOME")
+"""
+
+
+def bench_run(repeat: int) -> list[Result]:
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        script = os.path.join(tmp, "script.py")
+
+        with open(script, "w") as fp:
+            fp.write(textwrap.dedent(SCRIPT))
+
+        for mode, cmd in {
+            "python": [sys.executable, script],
+            "python_run": [sys.executable, "-m", "python_run", "-A", script],
+        }.items():
+
+            def func() -> None:
+                subprocess.run(cmd, check=True, cwd=ROOT)
+
+            results.append(
+                result("run", timeit(func, 1, repeat) * 1e3, "ms", mode=mode)
+            )
+
+    return results
+
+
+def bench_server(repeat: int) -> list[Result]:
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        script = os.path.join(tmp, "script.py")
+        path = os.path.join(tmp, "server.sock")
+
+        with open(script, "w") as fp:
+            fp.write(textwrap.dedent(SCRIPT))
+
+        server = subprocess.Popen(
+            [sys.executable, "-m", "python_run.server", path, "--workers", "4"],
+            cwd=ROOT,
+        )
+
+        try:
+            while not os.path.exists(path):
+                time.sleep(0.01)
+
+            for mode, func in {
+                "cold": lambda: subprocess.run(
+                    [sys.executable, "-m", "python_run", script, "-A"],
+                    check=True,
+                    cwd=ROOT,
+                ),
+                "client_process": lambda: subprocess.run(
+                    [sys.executable, "-m", "python_run.client", path, script, "-A"],
+                    check=True,
+                    cwd=ROOT,
+                ),
+                "client_in_process": lambda: client.run(path, [script, "-A"]),
+            }.items():
+                latency = timeit(func, repeat, 3)
+                results.append(result("server_job", latency * 1e3, "ms", mode=mode))
+                results.append(
+                    result("server_throughput", 1 / latency, "jobs/s", mode=mode)
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+    return results
+
+
+def compare(results: list[Result], baseline: list[Result], threshold: float) -> int:
+    # Compares against a previous run, returns the number of regressions
+    def key(i: Result) -> str:
+        return json.dumps([i["name"], i["params"]], sort_keys=True)
+
+    previous = {key(i): i for i in baseline}
+    regressions = 0
+
+    for i in results:
+        old = previous.get(key(i))
+
+        if old is None:
+            continue
+
+        # Higher is better for throughput, lower is better for latency
+        if i["unit"].endswith("/s"):
+            ratio = old["value"] / i["value"]
+        else:
+            ratio = i["value"] / old["value"]
+
+        if ratio > threshold:
+            regressions += 1
+            print(
+                f"regression: {i['name']} {i['params']} "
+                f"{old['value']:.1f} -> {i['value']:.1f} {i['unit']}",
+                file=sys.stderr,
+            )
+
+    return regressions
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(prog="python -m benchmarks")
+
+    arg_parser.add_argument("--output", "-o", help="Write the results to a file.")
+    arg_parser.add_argument(
+        "--compare", metavar="FILE", help="Compare against previous results."
+    )
+    arg_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="Slowdown ratio that counts as a regression (default: 1.2).",
+    )
+    arg_parser.add_argument(
+        "--quick", action="store_true", help="Fewer iterations and smaller sizes."
+    )
+
+    opts = arg_parser.parse_args()
+
+    number = 1_000 if opts.quick else 100_000
+    sizes = [10, 100, 1_000] if opts.quick else [10, 100, 1_000, 10_000, 100_000]
+
+    results = [
+        *bench_hook_events(number),
+        *bench_check_latency(sizes, number // 10),
+        *bench_parse_address(number),
+        *bench_environ(number),
+        *bench_run(3 if opts.quick else 10),
+        *bench_server(5 if opts.quick else 50),
+    ]
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    if opts.output:
+        with open(opts.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if opts.compare:
+        with open(opts.compare) as fp:
+            baseline = json.load(fp)["results"]
+
+        if compare(results, baseline, opts.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+from typing import Any
+
+# `import python_run` is done by the command line too, so the embedding API
+# is imported only when it's used
+
+
+def __getattr__(name: str) -> Any:
+    if name == "sandbox":
+        from .embed import sandbox
+
+        return sandbox
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,12 +3,18 @@ import os
 import runpy
 import sys
 
-from .hook import Hook, add_os_getenv_audit, patch_socket_get_host_by_name
+from .hook import Hook, install_patches
+from .network import fetch_remote_file, is_remote_file, resolve_hosts
 from .permission import Permission, PermissionAll, PermissionName, Permissions
-from .utils import split_string
+from .utils import get_cache_dir, parse_size, split_string
 
+# The modules of optional features are imported only when they are enabled,
+# everything imported here delays the start of the script
 
-def parse_args() -> tuple[argparse.Namespace, list[str]]:
+
+def parse_args(
+    args: list[str] | None = None,
+) -> tuple[argparse.Namespace, list[str]]:
     arg_parser = argparse.ArgumentParser()
 
     arg_parser.add_argument(
@@ -17,7 +23,7 @@ def parse_args() -> tuple[argparse.Namespace, list[str]]:
         const=True,
         default=False,
         type=split_string,
-        help="Allow environment access for things like getting and setting of environment variables. You can specify an optional, comma-separated list of environment variables to provide an allow-list of allowed environment variables.",
+        help="Allow environment access for things like getting and setting of environment variables. You can specify an optional, comma-separated list of environment variables or glob patterns (e.g. `AWS_*`) to provide an allow-list of allowed environment variables.",
     )
     arg_parser.add_argument(
         "--allow-net",
@@ -25,7 +31,14 @@ def parse_args() -> tuple[argparse.Namespace, list[str]]:
         const=True,
         default=False,
         type=split_string,
-        help="Allow network access. You can specify an optional, comma-separated list of IP addresses or hostnames (optionally with ports) to provide an allow-list of allowed network addresses.",
+        help="Allow network access. You can specify an optional, comma-separated list of IP addresses, CIDR blocks or hostnames (optionally with ports) to provide an allow-list of allowed network addresses.",
+    )
+    arg_parser.add_argument(
+        "--resolve-timeout",
+        metavar="SECONDS",
+        type=float,
+        default=2.0,
+        help="Hostnames allowed by --allow-net are resolved in parallel when the script starts, so connections to their addresses are allowed without a lookup. Wait at most SECONDS for them (default: 2), 0 disables it.",
     )
     arg_parser.add_argument(
         "--allow-read",
@@ -33,7 +46,7 @@ def parse_args() -> tuple[argparse.Namespace, list[str]]:
         const=True,
         default=False,
         type=split_string,
-        help="Allow file system read access. You can specify an optional, comma-separated list of directories or files to provide an allow-list of allowed file system access.",
+        help="Allow file system read access. You can specify an optional, comma-separated list of directories, files or glob patterns (e.g. `/data/*/cache/**`, `*.parquet`) to provide an allow-list of allowed file system access.",
     )
     arg_parser.add_argument(
         "--allow-write",
@@ -41,7 +54,7 @@ def parse_args() -> tuple[argparse.Namespace, list[str]]:
         const=True,
         default=False,
         type=split_string,
-        help="Allow file system write access. You can specify an optional, comma-separated list of directories or files to provide an allow-list of allowed file system access.",
+        help="Allow file system write access. You can specify an optional, comma-separated list of directories, files or glob patterns (e.g. `/data/*/cache/**`, `*.parquet`) to provide an allow-list of allowed file system access.",
     )
     arg_parser.add_argument(
         "--allow-run",
@@ -49,7 +62,13 @@ def parse_args() -> tuple[argparse.Namespace, list[str]]:
         const=True,
         default=False,
         type=split_string,
-        help="Allow running subprocesses. You can specify an optional, comma-separated list of subprocesses to provide an allow-list of allowed subprocesses. ",
+        help="Allow running subprocesses. You can specify an optional, comma-separated list of subprocesses or glob patterns (e.g. `/usr/bin/python3*`) to provide an allow-list of allowed subprocesses.",
+    )
+    arg_parser.add_argument(
+        "--filter-env",
+        action="store_true",
+        default=False,
+        help="Copy the allowed environment variables when the script starts, so reading them doesn't go through the permission checks. Reading other variables is still checked.",
     )
     arg_parser.add_argument(
         "--allow-all",
@@ -58,12 +77,128 @@ def parse_args() -> tuple[argparse.Namespace, list[str]]:
         default=False,
         help="Allow all permissions.",
     )
+    arg_parser.add_argument(
+        "--max-memory",
+        metavar="SIZE",
+        type=parse_size,
+        default=None,
+        help="Limit the address space of the script, and of each of its subprocesses, to SIZE (e.g. 512M or 2G).",
+    )
+    arg_parser.add_argument(
+        "--max-cpu-time",
+        metavar="SECONDS",
+        type=int,
+        default=None,
+        help="Limit the CPU time of the script, and of each of its subprocesses, to SECONDS.",
+    )
+    arg_parser.add_argument(
+        "--max-open-files",
+        metavar="N",
+        type=int,
+        default=None,
+        help="Limit the number of files the script can have open at the same time to N.",
+    )
+    arg_parser.add_argument(
+        "--max-file-size",
+        metavar="SIZE",
+        type=parse_size,
+        default=None,
+        help="Limit the size of each file the script writes to SIZE (e.g. 100M), a write past it fails with an error.",
+    )
+    arg_parser.add_argument(
+        "--max-write-bytes",
+        metavar="SIZE",
+        type=parse_size,
+        default=None,
+        help="End the script when its process has written more than SIZE (e.g. 1G) in total, to files, pipes and sockets. It's checked every 50 ms, so the script can go over it by what it writes in that time (Linux only). A usage summary is printed to stderr at exit when any of the --max-* options is used.",
+    )
+    arg_parser.add_argument(
+        "--propagate",
+        action="store_true",
+        default=False,
+        help="Apply the permissions, including the ones granted later, to the Python processes started by the script (subprocesses and multiprocessing workers). They can't prompt, unless --broker is used.",
+    )
+    arg_parser.add_argument(
+        "--policy",
+        metavar="FILE",
+        default=None,
+        help="Load permissions from a TOML or JSON policy file, or from a snapshot compiled with `python -m python_run.policy`. Relative paths in the policy are relative to its file.",
+    )
+    arg_parser.add_argument(
+        "--reload",
+        action="store_true",
+        default=False,
+        help="Revalidate a cached remote script with the server before running it.",
+    )
+    arg_parser.add_argument(
+        "--offline",
+        action="store_true",
+        default=False,
+        help="Only run remote scripts that are already cached, never download them.",
+    )
+    arg_parser.add_argument(
+        "--cache-bytecode",
+        action="store_true",
+        default=False,
+        help="Cache the compiled bytecode of the script and its imports in a private directory of python_run, instead of compiling them on every run.",
+    )
+    arg_parser.add_argument(
+        "--broker",
+        metavar="SOCKET",
+        default=os.environ.get("PYTHON_RUN_BROKER"),
+        help="Ask the permission broker listening on SOCKET (started with `python -m python_run.broker`) instead of prompting. Defaults to $PYTHON_RUN_BROKER.",
+    )
+    arg_parser.add_argument(
+        "--audit-log",
+        metavar="FILE",
+        default=None,
+        help="Append every permission decision (allowed, granted or denied) to FILE as JSON lines. Records are written in batches by a background thread, if it falls behind new records are dropped and their number is logged.",
+    )
+    arg_parser.add_argument(
+        "--learn",
+        metavar="FILE",
+        default=None,
+        help="Allow everything and record the permissions the script uses. At exit a policy for --policy is written to FILE (JSON if it ends with .json, TOML otherwise), with paths and hosts coalesced into their common directories and domains.",
+    )
+    arg_parser.add_argument(
+        "--learn-threshold",
+        type=int,
+        default=8,
+        metavar="N",
+        help="With --learn, a directory or domain replaces its entries in the policy when there are at least N of them (default: %(default)s, 0 keeps every entry).",
+    )
+    arg_parser.add_argument(
+        "--stats",
+        action="store_true",
+        default=False,
+        help="Count the audit events, permission checks and prompts handled by the hook, and the time spent in it. At exit a table is printed to stderr.",
+    )
+    arg_parser.add_argument(
+        "--stats-file",
+        metavar="FILE",
+        default=None,
+        help="Like --stats, but the counters are written to FILE as JSON.",
+    )
+    arg_parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        default=None,
+        help="Write the audit events handled by the hook, with their permission checks and time spent, to FILE in Chrome trace event format (can be opened in Perfetto).",
+    )
 
-    return arg_parser.parse_known_intermixed_args()
+    return arg_parser.parse_known_intermixed_args(args)
 
 
 def get_permissions(opts: argparse.Namespace) -> Permissions:
-    permissions = Permissions()
+    if opts.policy:
+        from .policy import load_policy
+
+        try:
+            permissions = load_policy(opts.policy)
+        except (OSError, ValueError) as e:
+            sys.exit(f"Cannot load policy {opts.policy!r}: {e}")
+    else:
+        permissions = Permissions()
 
     if opts.allow_all:
         for i in PermissionName:
@@ -85,27 +220,161 @@ def get_permissions(opts: argparse.Namespace) -> Permissions:
     return permissions
 
 
-def main() -> None:
-    opts, cmd = parse_args()
-
+def run(opts: argparse.Namespace, cmd: list[str]) -> None:
     file, *args = cmd
+
+    if is_remote_file(file):
+        try:
+            file = fetch_remote_file(
+                file, get_cache_dir(), reload=opts.reload, offline=opts.offline
+            )
+        except (OSError, ValueError) as e:
+            sys.exit(f"Cannot download {file!r}: {e}")
+
     file = os.path.abspath(file)
 
     permissions = get_permissions(opts)
 
-    hook = Hook(file, permissions)
+    if opts.resolve_timeout > 0 and not permissions.check_all(PermissionName.NET):
+        hosts = permissions.net_hosts()
+
+        if hosts:
+            resolve_hosts(hosts, opts.resolve_timeout)
+
+    tracer = None
+
+    if opts.trace:
+        import atexit
+
+        from .trace import Tracer
+
+        tracer = Tracer(open(opts.trace, "w"), name=f"python_run {file}")
+        atexit.register(tracer.dump)
+
+    code = None
+    private_dirs = []
+
+    if opts.cache_bytecode:
+        from .bytecode import get_code, run_code
+
+        bytecode_dir = os.path.join(get_cache_dir(), "bytecode")
+        private_dirs.append(bytecode_dir)
+
+        # Imports use the regular `__pycache__` layout, but under our directory
+        sys.pycache_prefix = os.path.join(bytecode_dir, "modules")
+        sys.dont_write_bytecode = False
+
+        code = get_code(file, os.path.join(bytecode_dir, "scripts"))
+    else:
+        sys.dont_write_bytecode = True
+
+    broker = None
+
+    if opts.broker:
+        from .broker import BrokerClient
+
+        try:
+            broker = BrokerClient(opts.broker)
+        except OSError as e:
+            sys.exit(f"Cannot connect to the broker {opts.broker!r}: {e}")
+
+    policy_file = None
+
+    if opts.propagate:
+        from .propagate import propagate
+
+        policy_file = propagate(file, permissions, opts.broker)
+
+    audit_log = None
+
+    if opts.audit_log:
+        import atexit
+
+        from .audit_log import AuditLog
 
-    add_os_getenv_audit()
+        audit_log = AuditLog(open(opts.audit_log, "a"))
+        atexit.register(audit_log.close)
 
-    patch_socket_get_host_by_name()
+    hook: Hook
 
-    sys.dont_write_bytecode = True
+    stats = opts.stats or opts.stats_file is not None
+
+    if opts.learn:
+        if stats:
+            sys.exit("--learn can't be used with --stats")
+
+        import atexit
+
+        from .learn import LearnHook
+
+        hook = LearnHook(
+            file, permissions, tracer, private_dirs, broker, audit_log, policy_file
+        )
+        atexit.register(hook.report, open(opts.learn, "w"), opts.learn_threshold)
+    elif stats:
+        import atexit
+
+        from .stats import StatsHook
+
+        hook = StatsHook(
+            file, permissions, tracer, private_dirs, broker, audit_log, policy_file
+        )
+
+        stats_file = None
+
+        if opts.stats_file is not None:
+            if os.path.abspath(opts.stats_file) == file:
+                sys.exit("--stats-file can't be the script")
+
+            stats_file = open(opts.stats_file, "w")
+
+        atexit.register(hook.report, stats_file)
+    else:
+        hook = Hook(
+            file, permissions, tracer, private_dirs, broker, audit_log, policy_file
+        )
+
+    if policy_file is not None:
+        import atexit
+
+        atexit.register(hook.remove_policy_file)
+
+    limits = (
+        opts.max_memory,
+        opts.max_cpu_time,
+        opts.max_open_files,
+        opts.max_file_size,
+        opts.max_write_bytes,
+    )
+
+    if any(i is not None for i in limits):
+        import atexit
+
+        from .limits import ResourceLimits
+
+        resource_limits = ResourceLimits(*limits)
+
+        try:
+            resource_limits.apply()
+        except ValueError as e:
+            sys.exit(f"Cannot apply the limits: {e}")
+
+        atexit.register(resource_limits.report)
+
+    install_patches(permissions, opts.filter_env)
 
     sys.argv[1:] = [file, *args]
 
     sys.addaudithook(hook)
 
-    runpy.run_path(file, run_name="__main__")
+    if code is not None:
+        run_code(code, file)
+    else:
+        runpy.run_path(file, run_name="__main__")
+
+
+def main() -> None:
+    run(*parse_args())
 
 
 if __name__ == "__main__":  # pragma: no cover
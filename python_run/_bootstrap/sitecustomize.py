@@ -0,0 +1,15 @@
+# Put first in the PYTHONPATH of child processes by `python_run --propagate`,
+# it installs the hook of the parent before anything else runs
+
+import os
+import sys
+
+try:
+    from python_run.propagate import install_child
+except Exception as e:  # pragma: no cover
+    # e.g. a Python version that python_run doesn't support
+    sys.stderr.write(f"python_run: cannot apply the permissions: {e}\n")
+    sys.stderr.flush()
+    os._exit(1)
+
+install_child()
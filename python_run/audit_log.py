@@ -0,0 +1,136 @@
+import collections
+import json
+import os
+import threading
+import time
+import weakref
+from typing import IO
+
+from .permission import Permission, PermissionAll
+
+# The logs that are still open, their writers are restarted in forked children
+_open_logs: "weakref.WeakSet[AuditLog]" = weakref.WeakSet()
+
+
+def _after_fork_in_child() -> None:
+    for audit_log in list(_open_logs):
+        audit_log._after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class AuditLog:
+    def __init__(
+        self, file: IO[str], maxsize: int = 65536, interval: float = 0.5
+    ) -> None:
+        # The file is opened by the caller before the hook is installed,
+        # and writing to an open file doesn't raise audit events
+        self._file = file
+        self._pid = os.getpid()
+        self._maxsize = maxsize
+        self._interval = interval
+        # `append` and `popleft` of a deque are atomic, so the hook never
+        # waits for the writer
+        self._records: collections.deque[
+            tuple[float, Permission, str]
+        ] = collections.deque()
+        self._dropped = 0
+        self._reported = 0
+        self._write_through = False
+        self._lock = threading.Lock()
+        self._start()
+
+        _open_logs.add(self)
+
+    def _start(self) -> None:
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="python_run-audit-log", daemon=True
+        )
+        self._thread.start()
+
+    def _after_fork(self) -> None:
+        # Only the thread that forked survives, the records waiting for the
+        # parent's writer are written by the parent
+        self._pid = os.getpid()
+        self._records.clear()
+        self._dropped = self._reported = 0
+        # The parent's writer may have held it while forking
+        self._lock = threading.Lock()
+        self._start()
+
+        # Forked children often end with `os._exit` (e.g. the workers of
+        # multiprocessing), which skips `atexit`, so each record is written
+        # as soon as it's added
+        self._write_through = True
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def add(self, permission: Permission, decision: str) -> None:
+        # The newest records are dropped, so the log keeps everything up to
+        # the moment the writer fell behind
+        if len(self._records) >= self._maxsize:
+            self._dropped += 1
+            return
+
+        self._records.append((time.time(), permission, decision))
+
+        if self._write_through:
+            self._write_batch()
+
+    def _write_batch(self) -> None:
+        with self._lock:
+            self._write_batch_locked()
+
+    def _write_batch_locked(self) -> None:
+        lines = []
+
+        while self._records:
+            ts, (name, value), decision = self._records.popleft()
+
+            lines.append(
+                json.dumps(
+                    {
+                        "ts": ts,
+                        "pid": self._pid,
+                        "permission": name.value,
+                        "value": None if value is PermissionAll else value,
+                        "decision": decision,
+                    }
+                )
+            )
+
+        dropped = self._dropped
+
+        if dropped != self._reported:
+            lines.append(
+                json.dumps(
+                    {
+                        "ts": time.time(),
+                        "pid": self._pid,
+                        "dropped": dropped - self._reported,
+                    }
+                )
+            )
+            self._reported = dropped
+
+        if lines:
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            self._write_batch()
+
+    def close(self) -> None:
+        _open_logs.discard(self)
+
+        self._stop.set()
+        self._thread.join()
+
+        # The records added after the last batch of the writer
+        self._write_batch()
+        self._file.close()
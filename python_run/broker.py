@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+from typing import Callable
+
+from .hook import Hook
+from .permission import Permission, PermissionAll, PermissionName, Permissions
+from .policy import load_policy
+
+# The protocol is one JSON object per line:
+#   request:  {"name": "read", "value": "/tmp/file"}
+#   response: {"granted": true}
+
+
+class _Pending:
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.granted = False
+
+
+class Broker(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        path: str,
+        permissions: Permissions | None = None,
+        prompt: Callable[[Permission], bool] = Hook._prompt,
+    ) -> None:
+        self._permissions = permissions or Permissions()
+        self._denied: set[Permission] = set()
+        self._prompt = prompt
+        self._pending: dict[Permission, _Pending] = {}
+        self._lock = threading.Lock()
+        # Only one prompt at a time is shown on the operator's terminal
+        self._prompt_lock = threading.Lock()
+
+        super().__init__(path, _BrokerHandler)
+
+    def server_bind(self) -> None:
+        # Only the owner may connect. The socket is created with the umask, a
+        # `chmod` after `bind` would leave a window for other users
+        umask = os.umask(0o177)
+
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def decide(self, permission: Permission) -> bool:
+        with self._lock:
+            if self._permissions.check(permission):
+                return True
+
+            if permission in self._denied:
+                return False
+
+            pending = self._pending.get(permission)
+            owner = pending is None
+
+            if pending is None:
+                pending = self._pending[permission] = _Pending()
+
+        # Identical requests from other processes wait for the same answer
+        if not owner:
+            pending.event.wait()
+            return pending.granted
+
+        try:
+            with self._prompt_lock:
+                # Another prompt may have granted it in the meantime
+                granted = self._permissions.check(permission) or self._prompt(
+                    permission
+                )
+
+            with self._lock:
+                if granted:
+                    self._permissions.allow(permission.literal())
+                else:
+                    self._denied.add(permission)
+
+            pending.granted = granted
+        finally:
+            with self._lock:
+                del self._pending[permission]
+
+            pending.event.set()
+
+        return granted
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    server: Broker
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                name, value = PermissionName(request["name"]), request["value"]
+            except (ValueError, KeyError, TypeError):
+                granted = False
+            else:
+                granted = isinstance(value, str) and self.server.decide(
+                    Permission(name, value)
+                )
+
+            self.wfile.write(json.dumps({"granted": granted}).encode() + b"\n")
+
+
+class BrokerClient:
+    def __init__(self, path: str) -> None:
+        # Must be created before the hook is installed, so that connecting
+        # to the broker doesn't require a permission
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._file = self._socket.makefile("rwb")
+        self._lock = threading.Lock()
+
+    def request(self, permission: Permission) -> bool:
+        name, value = permission
+
+        if value is PermissionAll:
+            return False
+
+        try:
+            with self._lock:
+                self._file.write(
+                    json.dumps({"name": name.value, "value": value}).encode() + b"\n"
+                )
+                self._file.flush()
+                response = self._file.readline()
+
+            return json.loads(response)["granted"] is True
+        except (OSError, ValueError, KeyError, TypeError):
+            # The broker is gone, deny everything it didn't already grant
+            return False
+
+    def close(self) -> None:
+        self._file.close()
+        self._socket.close()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m python_run.broker",
+        description="Decide permission requests for many python_run processes.",
+    )
+
+    arg_parser.add_argument("socket", help="Path of the Unix socket to listen on.")
+    arg_parser.add_argument(
+        "--policy", metavar="FILE", help="Permissions granted from the start."
+    )
+
+    opts = arg_parser.parse_args()
+
+    permissions = load_policy(opts.policy) if opts.policy else None
+
+    with Broker(opts.socket, permissions) as broker:
+        try:
+            broker.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(opts.socket)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,61 @@
+import hashlib
+import importlib.util
+import marshal
+import os
+import sys
+import tempfile
+import types
+
+
+def get_code(file: str, cache_dir: str) -> types.CodeType:
+    with open(file, "rb") as fp:
+        source = fp.read()
+
+    # The file name is part of the key because it is stored in the code object
+    key = hashlib.sha256(
+        importlib.util.MAGIC_NUMBER + os.fsencode(file) + b"\0" + source
+    ).hexdigest()
+
+    path = os.path.join(cache_dir, key + ".pyc")
+
+    try:
+        with open(path, "rb") as fp:
+            return marshal.load(fp)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    code = compile(source, file, "exec", dont_inherit=True)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+
+        fd, tmp = tempfile.mkstemp(dir=cache_dir)
+
+        with os.fdopen(fd, "wb") as fp:
+            marshal.dump(code, fp)
+
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+    return code
+
+
+def run_code(code: types.CodeType, file: str) -> None:
+    # Like `runpy.run_path`, but with an already compiled script
+
+    module = types.ModuleType("__main__")
+    module.__file__ = file
+    module.__cached__ = None  # type: ignore
+
+    main_module = sys.modules["__main__"]
+    argv0 = sys.argv[0]
+
+    sys.modules["__main__"] = module
+    sys.argv[0] = file
+
+    try:
+        exec(code, module.__dict__)
+    finally:
+        sys.modules["__main__"] = main_module
+        sys.argv[0] = argv0
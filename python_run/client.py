@@ -0,0 +1,60 @@
+import json
+import os
+import socket
+import struct
+import sys
+
+# Kept free of heavy imports, so starting a client costs as little as possible
+
+HEADER = struct.Struct("!I")
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = b""
+
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+
+        if not chunk:
+            raise ConnectionError("Connection closed by the server")
+
+        data += chunk
+
+    return data
+
+
+def run(path: str, argv: list[str], fds: tuple[int, int, int] = (0, 1, 2)) -> int:
+    job = json.dumps(
+        {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+    ).encode()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+
+        # The worker runs the script with our stdin, stdout and stderr
+        socket.send_fds(sock, [HEADER.pack(len(job))], list(fds))
+        sock.sendall(job)
+
+        (code,) = HEADER.unpack(recv_exactly(sock, HEADER.size))
+
+        # Waits for the worker to exit, so its output is complete
+        while sock.recv(4096):
+            pass
+
+    return code
+
+
+def main() -> None:
+    if len(sys.argv) < 3:
+        sys.exit("usage: python -m python_run.client SOCKET FILE [ARGS...]")
+
+    path, *argv = sys.argv[1:]
+
+    try:
+        sys.exit(run(path, argv))
+    except OSError as e:
+        sys.exit(f"Cannot run through the server {path!r}: {e}")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,191 @@
+import contextlib
+import contextvars
+import sys
+import threading
+from typing import TYPE_CHECKING, Any, Iterator
+
+from .hook import (
+    HandlerResult,
+    Hook,
+    HookExit,
+    add_os_getenv_audit,
+    patch_os_open_dir_fd,
+    patch_os_posix_spawn,
+    patch_socket_get_host_by_name,
+)
+from .permission import Permission, Permissions
+
+if TYPE_CHECKING:  # pragma: no cover
+    from types import FrameType
+
+# Like the command line, this guards against code that uses the regular APIs,
+# it doesn't isolate code that is written to escape it (e.g. with `ctypes`)
+
+# The permissions of the sandboxes entered in the current context, from the
+# outermost, an event must be allowed by all of them
+_sandboxes: contextvars.ContextVar[tuple[Permissions, ...]] = contextvars.ContextVar(
+    "python_run_sandboxes", default=()
+)
+
+
+class _ThreadStart(threading.local):
+    # Set while `threading.Thread.start` starts a thread in a sandbox
+    active = False
+
+
+_thread_start = _ThreadStart()
+
+
+class _Entered(threading.local):
+    # (frame of the `with` block, sandboxes) of the sandboxes entered in this
+    # thread and not exited yet, from the outermost
+    def __init__(self) -> None:
+        self.blocks: list[tuple[FrameType, tuple[Permissions, ...]]] = []
+
+
+_entered = _Entered()
+
+
+def _active() -> tuple[Permissions, ...]:
+    sandboxes = _sandboxes.get()
+    blocks = _entered.blocks
+
+    if sandboxes or not blocks:
+        return sandboxes
+
+    # Code in a sandbox can call a function in another context, e.g. with
+    # `contextvars.Context().run(fn)`, but the sandbox is still on the stack.
+    # Tasks and threads that run while it's suspended are not under it
+    frames = {id(frame): i for frame, i in blocks}
+    frame = sys._getframe(1)
+
+    while frame is not None:
+        found = frames.get(id(frame))
+
+        if found is not None:
+            return found
+
+        frame = frame.f_back  # type: ignore
+
+    return ()
+
+
+class SandboxHook(Hook):
+    def __init__(self) -> None:
+        super().__init__("", Permissions())
+
+        self._handlers["_thread.start_new_thread"] = self._on_start_new_thread
+        # Only the command line exits on Ctrl+C without running the handlers
+        del self._handlers["sys.excepthook"]
+
+    def _on_start_new_thread(self, args: tuple[Any, ...]) -> HandlerResult:
+        # Threads don't inherit the context, only those started by
+        # `threading.Thread` are made to run in the sandbox
+        if not _thread_start.active and _active():
+            raise PermissionError("Cannot start a thread with _thread in a sandbox")
+
+        return None
+
+    def _check_permission(self, permission: Permission) -> HookExit:
+        if all(i.check(permission) for i in _active()):
+            return HookExit.PERMISSION_OK
+
+        # Unlike the command line there is no one to prompt, and exiting would
+        # stop the whole server
+        raise PermissionError(
+            f"Requires {permission.name} access to {permission.value!r}"
+        )
+
+    def __call__(self, event: str, args: tuple[Any, ...]) -> HookExit | None:
+        # Code outside of the sandboxes is not checked
+        if not _sandboxes.get() and not _entered.blocks:
+            return None
+
+        return super().__call__(event, args)
+
+
+def _patch_thread_start() -> None:
+    __thread_start = threading.Thread.start
+
+    def start(self: threading.Thread) -> None:
+        sandboxes = _active()
+
+        if not sandboxes:
+            return __thread_start(self)
+
+        context = contextvars.copy_context()
+        context.run(_sandboxes.set, sandboxes)
+        run = self.run
+
+        self.run = lambda: context.run(run)  # type: ignore
+
+        _thread_start.active = True
+
+        try:
+            __thread_start(self)
+        finally:
+            _thread_start.active = False
+
+    threading.Thread.start = start  # type: ignore
+
+
+def _patch_executor_submit() -> None:
+    from concurrent.futures import ThreadPoolExecutor
+
+    __submit = ThreadPoolExecutor.submit
+
+    # The threads of a pool are shared by everything that submits to it (e.g.
+    # `loop.run_in_executor`), so each work item runs in the context of the
+    # code that submitted it, not of the code that started the thread
+    def submit(self, fn, /, *args, **kwargs):
+        context = contextvars.copy_context()
+        sandboxes = _active()
+
+        if sandboxes:
+            context.run(_sandboxes.set, sandboxes)
+
+        return __submit(self, context.run, fn, *args, **kwargs)
+
+    ThreadPoolExecutor.submit = submit  # type: ignore
+
+
+_hook: SandboxHook | None = None
+_lock = threading.Lock()
+
+
+def install() -> SandboxHook:
+    # Audit hooks can't be removed, so a single one serves all the sandboxes
+    global _hook
+
+    with _lock:
+        if _hook is None:
+            add_os_getenv_audit()
+            patch_socket_get_host_by_name()
+            patch_os_open_dir_fd()
+            patch_os_posix_spawn()
+            _patch_thread_start()
+            _patch_executor_submit()
+
+            _hook = SandboxHook()
+            sys.addaudithook(_hook)
+
+        return _hook
+
+
+@contextlib.contextmanager
+def sandbox(permissions: Permissions) -> Iterator[Permissions]:
+    install()
+
+    sandboxes = (*_active(), permissions)
+    token = _sandboxes.set(sandboxes)
+
+    # The caller of `__enter__`
+    block = (sys._getframe(2), sandboxes)
+    blocks = _entered.blocks
+    blocks.append(block)
+
+    try:
+        yield permissions
+    finally:
+        _sandboxes.reset(token)
+        del blocks[next(i for i, j in enumerate(blocks) if j is block)]
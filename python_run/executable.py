@@ -0,0 +1,116 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Mapping
+
+# Resolution runs inside the audit hook, so it must not raise audit events
+# itself: it reads `PATH` from the raw dict of `os.environ` and only uses
+# `stat`-like calls
+
+
+def get_exec_path(env: Mapping[Any, Any] | None = None) -> list[str]:
+    if env is None or isinstance(env, os._Environ):
+        value = os.environ._data.get(os.environ.encodekey("PATH"))  # type: ignore
+        path = os.defpath if value is None else os.environ.decodevalue(value)
+
+        return path.split(os.pathsep)
+
+    return os.get_exec_path(env)
+
+
+def is_executable(path: str) -> bool:
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+Entry = tuple[str | None, tuple[tuple[str, int | None], ...]]
+
+
+class ExecutableCache:
+    def __init__(self, maxsize: int = 1024) -> None:
+        self._maxsize = maxsize
+        # (name, directories) -> (real path, mtimes of the directories searched)
+        self._data: OrderedDict[tuple[str, tuple[str, ...]], Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _search(self, name: str, dirs: tuple[str, ...]) -> Entry:
+        mtimes = []
+
+        for dir in dirs:
+            # Taken before looking in the directory, so a change made while
+            # searching invalidates the entry
+            mtimes.append((dir, _mtime(dir)))
+
+            path = os.path.join(dir, name)
+
+            if is_executable(path):
+                return os.path.realpath(path), tuple(mtimes)
+
+        return None, tuple(mtimes)
+
+    def which(self, name: str, dirs: tuple[str, ...]) -> str | None:
+        key = (name, dirs)
+
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is not None:
+                self._data.move_to_end(key)
+
+        # Adding, removing or renaming an executable changes the mtime of its
+        # directory, only the directories before the match can change it
+        if entry is not None and all(_mtime(i) == j for i, j in entry[1]):
+            return entry[0]
+
+        entry = self._search(name, dirs)
+
+        with self._lock:
+            self._data[key] = entry
+
+            if len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+        return entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+executable_cache = ExecutableCache()
+
+
+def resolve_executable(
+    name: str | bytes | os.PathLike[Any],
+    env: Mapping[Any, Any] | None = None,
+    cwd: str | bytes | os.PathLike[Any] | None = None,
+    search: bool = True,
+) -> str:
+    name = os.fsdecode(name)
+
+    if search and not os.path.dirname(name):
+        dirs = tuple(get_exec_path(env))
+
+        # Relative directories depend on the current directory, so they are
+        # part of the cache key only as absolute paths
+        if not all(map(os.path.isabs, dirs)):
+            dirs = tuple(os.path.abspath(i or os.curdir) for i in dirs)
+
+        path = executable_cache.which(name, dirs)
+
+        # Not found, running it will fail anyway
+        return name if path is None else path
+
+    if cwd is not None:
+        name = os.path.join(os.fsdecode(cwd), name)
+
+    return os.path.realpath(name)
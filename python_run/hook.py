@@ -1,15 +1,59 @@
 import enum
 import os
-import socket
 import sys
-from typing import Any
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Iterable
 
+from .executable import is_executable, resolve_executable
 from .network import ip2host_cache
+from .paths import PathResolver, get_dir_fd_path, get_open_access
 from .permission import Permission, PermissionName, Permissions
 from .utils import bold, clear_lines, is_env_set, italic, parse_address
 
+if TYPE_CHECKING:  # pragma: no cover
+    from types import FrameType
+
+    from .audit_log import AuditLog
+    from .broker import BrokerClient
+    from .propagate import PolicyFile
+    from .trace import Tracer
+
 PYTHON_NO_PROMPT = is_env_set("PYTHON_NO_PROMPT")
 
+_PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "")
+
+# The calls through which importlib reads and writes the bytecode of the
+# module it's importing, from the innermost
+_BYTECODE_READ = ("get_data", "get_code")
+_BYTECODE_WRITE = ("_write_atomic", "set_data", "_cache_bytecode", "get_code")
+
+
+def _is_bytecode_access(calls: tuple[str, ...]) -> bool:
+    frame: FrameType | None = sys._getframe(1)
+
+    # Skips the frames of the hook itself
+    while frame is not None and frame.f_code.co_filename.startswith(_PACKAGE_DIR):
+        frame = frame.f_back
+
+    for name in calls:
+        if (
+            frame is None
+            or frame.f_code.co_name != name
+            or frame.f_code.co_filename != "<frozen importlib._bootstrap_external>"
+        ):
+            return False
+
+        if name == "get_code":
+            # A subclass could compile any source it likes
+            from importlib.machinery import SourceFileLoader
+
+            return type(frame.f_locals.get("self")) is SourceFileLoader
+
+        frame = frame.f_back
+
+    return False  # pragma: no cover
+
 
 class HookExit(enum.IntEnum):
     INPUT = 1
@@ -18,13 +62,88 @@ class HookExit(enum.IntEnum):
     OPEN_CURRENT_FILE = 4
     PERMISSION_OK = 5
     PERMISSION_GRANTED = 6
+    OPEN_PRIVATE = 7
+
+
+HandlerResult = HookExit | Permission | None
+
+
+class _ThreadState(threading.local):
+    # Number of `import` events whose `open` has not been seen yet
+    imports = 0
+    # Set while the hook writes the policy file itself
+    internal = False
+
+
+class _OpenDirFd(threading.local):
+    # (path, resolved path) of the `os.open` with a `dir_fd` in progress, set
+    # by the patched `os.open` itself. An audit event would let the script
+    # plant one for its next `open`
+    pending: tuple[Any, str | None] | None = None
+
+
+_open_dir_fd = _OpenDirFd()
 
 
 class Hook:
-    def __init__(self, file: str, permissions: Permissions) -> None:
-        self._file = file
+    def __init__(
+        self,
+        file: str,
+        permissions: Permissions,
+        tracer: "Tracer | None" = None,
+        private_dirs: Iterable[str] = (),
+        broker: "BrokerClient | None" = None,
+        audit_log: "AuditLog | None" = None,
+        policy_file: "PolicyFile | None" = None,
+    ) -> None:
+        # Paths are checked after resolving symlinks
+        self._paths = PathResolver()
+        self._file = self._paths.realpath(file) if file else file
         self._permissions = permissions
-        self._imports = 0
+        self._tracer = tracer
+        # Asked instead of prompting when the permissions are not enough
+        self._broker = broker
+        # Records every permission decision
+        self._audit_log = audit_log
+        # Gets the granted permissions, for the child processes started later
+        self._policy_file = policy_file
+        # Directories owned by python_run (e.g. the bytecode cache), only
+        # importlib may write to them without a permission
+        self._private_dirs = tuple(
+            os.path.join(os.path.realpath(i), "") for i in private_dirs
+        )
+        # The script may never write to the directory of the policy file,
+        # whatever its permissions, or it could grant itself anything
+        self._policy_dir = (
+            os.path.join(os.path.realpath(os.path.dirname(policy_file.path)), "")
+            if policy_file is not None
+            else None
+        )
+        self._thread = _ThreadState()
+
+        self._handlers: dict[str, Callable[[tuple[Any, ...]], HandlerResult]] = {
+            "builtins.input": self._on_input,
+            "builtins.input/result": self._on_input,
+            "object.__setattr__": self._on_object_setattr,
+            "open": self._on_open,
+            "os.rename": self._on_fs_link,
+            "os.link": self._on_fs_link,
+            "os.remove": self._on_fs_remove,
+            "os.rmdir": self._on_fs_remove,
+            "os.symlink": self._on_fs_link,
+            "os.fork": self._on_fs_change,
+            "os.system": self._on_fs_change,
+            "os.exec": self._on_os_exec,
+            "os.posix_spawn": self._on_os_posix_spawn,
+            "subprocess.Popen": self._on_subprocess_popen,
+            "os.putenv": self._on_os_env,
+            "os.unsetenv": self._on_os_env,
+            "os.getenv": self._on_os_env,
+            "socket.connect": self._on_socket_connect,
+            "__socket_get_host_by_name": self._on_socket_get_host_by_name,
+            "import": self._on_import,
+            "sys.excepthook": self._on_sys_excepthook,
+        }
 
     @classmethod
     def _prompt(cls, permission: Permission) -> bool:
@@ -33,8 +152,10 @@ class Hook:
         if permission.name == PermissionName.NET:
             host, _ = parse_address(permission.value)  # type: ignore
 
-            if host in ip2host_cache:
-                value = f"{permission.value} ({ip2host_cache[host]})"
+            hosts = ip2host_cache.get(host)
+
+            if hosts:
+                value = f"{permission.value} ({', '.join(sorted(hosts))})"
 
         print("⚠️ ", bold(f"Python requests {name} to {value!r}."))
         print(italic(f"Run again with --allow-{name} to bypass this prompt."))
@@ -61,94 +182,289 @@ class Hook:
             "__getitem__",
         ]
 
-    def __call__(self, event: str, args: tuple[Any, ...]) -> HookExit | None:
-        permission: Permission | None = None
+    def reset_imports(self) -> None:
+        # A failed `import` never opens the file it counts on
+        self._thread.imports = 0
 
-        match event:
-            # Since we call `input` in this hook we need to avoid infinite recursion
-            case "builtins.input" | "builtins.input/result":
-                return HookExit.INPUT
+    def _on_input(self, args: tuple[Any, ...]) -> HandlerResult:
+        # Since we call `input` in this hook we need to avoid infinite recursion
+        return HookExit.INPUT
 
-            # Prevents the user from overriding the changes we made to `os.environ`
-            case "object.__setattr__":
-                obj, name, _ = args
+    def _on_object_setattr(self, args: tuple[Any, ...]) -> HandlerResult:
+        # Prevents the user from overriding the changes we made to `os.environ`
+        obj, name, _ = args
 
-                if self._is_protected_os_env_attr(obj, name):
-                    raise RuntimeError(f"Cannot change the {name!r} of os.environ")
+        if self._is_protected_os_env_attr(obj, name):
+            raise RuntimeError(f"Cannot change the {name!r} of os.environ")
 
-            # read/write access
+        return None
 
-            case "open":
-                # Ignores all calls to `open` that occur due to an `import` statement
-                if self._imports:
-                    self._imports -= 1
-                    return HookExit.OPEN_IMPORT
+    def _update_policy_file(self, func: Callable[..., None], *args: Any) -> None:
+        if self._policy_file is None or self._policy_file.read_only:
+            return
 
-                path, mode, _ = args
-                path = os.path.abspath(path)
+        self._thread.internal = True
 
-                # Ignores calls to `open` the file we are running
-                if path == self._file and mode == "r":
-                    return HookExit.OPEN_CURRENT_FILE
+        try:
+            func(*args)
+        finally:
+            self._thread.internal = False
 
-                if "r" in mode:
-                    permission = Permission(PermissionName.READ, path)
-                elif "w" in mode or "a" in mode:
-                    permission = Permission(PermissionName.WRITE, path)
+    def remove_policy_file(self) -> None:
+        if self._policy_file is not None:
+            self._update_policy_file(self._policy_file.remove)
 
-            # run access
+    def _check_policy_dir(self, path: str) -> None:
+        if self._policy_dir is not None and os.path.join(path, "").startswith(
+            self._policy_dir
+        ):
+            sys.exit(f"Cannot write to {path!r}, it holds the permissions")
 
-            case "os.exec":
-                path, _ = args
+    # read/write access
 
-                permission = Permission(PermissionName.RUN, path)
+    def _on_open(self, args: tuple[Any, ...]) -> HandlerResult:
+        # Ignores all calls to `open` that occur due to an `import` statement
+        thread = self._thread
 
-            # env access
+        if thread.internal:
+            return None
 
-            case "os.putenv" | "os.unsetenv" | "os.getenv":
-                key, *_ = args
+        if thread.imports:
+            thread.imports -= 1
+            return HookExit.OPEN_IMPORT
 
-                permission = Permission(PermissionName.ENV, key)
+        path, mode, flags = args
 
-            # net access
+        # Wrapping an already open file descriptor doesn't give any new access
+        if isinstance(path, int):
+            return None
 
-            case "socket.connect":
-                _, address = args
+        pending = _open_dir_fd.pending
 
-                host, port = address
+        if pending is not None and pending[0] == path and pending[1] is not None:
+            path = pending[1]
 
-                permission = Permission(PermissionName.NET, f"{host}:{port}")
+        path = self._paths.realpath(path)
+        read, write = get_open_access(mode, flags)
 
-            case "__socket_get_host_by_name":
-                host, ip = args
+        if path.startswith(self._private_dirs) and _is_bytecode_access(
+            _BYTECODE_WRITE if write else _BYTECODE_READ
+        ):
+            return HookExit.OPEN_PRIVATE
 
-                ip2host_cache[ip] = host
+        # Ignores calls to `open` the file we are running
+        if path == self._file and not write:
+            return HookExit.OPEN_CURRENT_FILE
 
-            case "import":
-                self._imports += 1
-                return HookExit.IMPORT
+        if write:
+            self._check_policy_dir(path)
 
-            # End the program if the user tries to exit
-            case "sys.excepthook":
-                _, type, _, _ = args
+            # `r+`, `O_RDWR` and friends need both
+            if read:
+                self._check_permission(Permission(PermissionName.READ, path))
 
-                if type is KeyboardInterrupt:
-                    os._exit(1)
+            return Permission(PermissionName.WRITE, path)
+        elif read:
+            return Permission(PermissionName.READ, path)
 
-        if permission:
-            if self._permissions.check(permission):
-                return HookExit.PERMISSION_OK
+        return None
 
-            if not PYTHON_NO_PROMPT and self._prompt(permission):
-                self._permissions.allow(permission)
-                return HookExit.PERMISSION_GRANTED
-            else:
-                # Throwing an exception doesn't work well because it will
-                # be caught by the try...except block
-                sys.exit(
-                    f"Requires {permission.name} access to {permission.value!r}, "
-                    f"run again with the --allow-{permission.name} flag"
-                )
+    def _on_fs_change(self, args: tuple[Any, ...]) -> HandlerResult:
+        # Renames, removals and new symlinks can change what a path resolves
+        # to, and so can other processes. These are rare, so the whole cache
+        # is dropped
+        self._paths.clear()
+
+        return None
+
+    def _on_fs_remove(self, args: tuple[Any, ...]) -> HandlerResult:
+        path, dir_fd = args
+        self._paths.clear()
+
+        if self._policy_dir is None or self._thread.internal:
+            return None
+
+        # Children can't start without the policy file
+        if dir_fd != -1:
+            resolved = get_dir_fd_path(dir_fd, os.fsdecode(path))
+        else:
+            resolved = self._paths.realpath(path)
+
+        if resolved is not None:
+            self._check_policy_dir(resolved)
+
+        return None
+
+    def _on_fs_link(self, args: tuple[Any, ...]) -> HandlerResult:
+        _, dst, *_ = args
+        self._paths.clear()
+
+        if self._thread.internal or not isinstance(dst, (str, bytes)):
+            return None
+
+        path = self._paths.realpath(dst)
+        self._check_policy_dir(path)
+
+        # Moving or linking a file into our directories is writing it there,
+        # e.g. a forged `.pyc` that the bytecode cache would run
+        if path.startswith(self._private_dirs) and not _is_bytecode_access(
+            _BYTECODE_WRITE
+        ):
+            return Permission(PermissionName.WRITE, path)
+
+        return None
+
+    # run access
+
+    def _on_os_exec(self, args: tuple[Any, ...]) -> HandlerResult:
+        path, *_ = args
+        self._paths.clear()
+
+        # `os.execvp` raises the event for every directory in PATH it tries,
+        # the ones without the executable fail anyway
+        if not is_executable(os.fsdecode(path)):
+            return None
+
+        return Permission(PermissionName.RUN, resolve_executable(path, search=False))
+
+    def _on_os_posix_spawn(self, args: tuple[Any, ...]) -> HandlerResult:
+        path, *_ = args
+        self._paths.clear()
+
+        # The event doesn't tell `posix_spawn` from `posix_spawnp`, so a bare
+        # name is looked up in PATH. The patched `posix_spawn` never passes one
+        return Permission(PermissionName.RUN, resolve_executable(path))
+
+    def _on_subprocess_popen(self, args: tuple[Any, ...]) -> HandlerResult:
+        executable, args_, cwd, env = args
+        self._paths.clear()
+
+        if executable is None:
+            executable = args_ if isinstance(args_, (str, bytes)) else args_[0]
+
+        # The child looks the executable up in its own PATH, after `chdir`
+        return Permission(
+            PermissionName.RUN, resolve_executable(executable, env=env, cwd=cwd)
+        )
+
+    # env access
+
+    def _on_os_env(self, args: tuple[Any, ...]) -> HandlerResult:
+        key, *_ = args
+
+        # `os.get_exec_path` looks up `b"PATH"` too
+        return Permission(PermissionName.ENV, os.fsdecode(key))
+
+    # net access
+
+    def _on_socket_connect(self, args: tuple[Any, ...]) -> HandlerResult:
+        _, address = args
+
+        host, port = address
+
+        return Permission(PermissionName.NET, f"{host}:{port}")
+
+    def _on_socket_get_host_by_name(self, args: tuple[Any, ...]) -> HandlerResult:
+        host, ip = args
+
+        ip2host_cache.add(ip, host)
+
+        return None
+
+    def _on_import(self, args: tuple[Any, ...]) -> HandlerResult:
+        self._thread.imports += 1
+        return HookExit.IMPORT
+
+    def _on_sys_excepthook(self, args: tuple[Any, ...]) -> HandlerResult:
+        # End the program if the user tries to exit
+        _, type, _, _ = args
+
+        if type is KeyboardInterrupt:
+            os._exit(1)
+
+        return None
+
+    def _check_permission(self, permission: Permission) -> HookExit:
+        audit_log = self._audit_log
+
+        if self._permissions.check(permission):
+            if audit_log is not None:
+                audit_log.add(permission, "allowed")
+
+            return HookExit.PERMISSION_OK
+
+        if self._broker is not None:
+            granted = self._broker.request(permission)
+        else:
+            granted = not PYTHON_NO_PROMPT and self._prompt(permission)
+
+        if audit_log is not None:
+            audit_log.add(permission, "granted" if granted else "denied")
+
+        if granted:
+            self._permissions.allow(permission.literal())
+
+            if self._policy_file is not None:
+                self._update_policy_file(self._policy_file.write, self._permissions)
+
+            return HookExit.PERMISSION_GRANTED
+        else:
+            # Throwing an exception doesn't work well because it will
+            # be caught by the try...except block
+            sys.exit(
+                f"Requires {permission.name} access to {permission.value!r}, "
+                f"run again with the --allow-{permission.name} flag"
+            )
+
+    def __call__(self, event: str, args: tuple[Any, ...]) -> HookExit | None:
+        # Most audit events are not interesting to us, so they should cost
+        # no more than a single dict lookup
+        handler = self._handlers.get(event)
+
+        if handler is None:
+            return None
+
+        if self._tracer is not None:
+            return self._traced_call(event, handler, args)
+
+        result = handler(args)
+
+        if isinstance(result, Permission):
+            return self._check_permission(result)
+
+        return result
+
+    def _traced_call(
+        self,
+        event: str,
+        handler: Callable[[tuple[Any, ...]], HandlerResult],
+        args: tuple[Any, ...],
+    ) -> HookExit | None:
+        permission: Permission | None = None
+        verdict = "NONE"
+        start = time.perf_counter_ns()
+
+        try:
+            result = handler(args)
+
+            if isinstance(result, Permission):
+                permission = result
+                result = self._check_permission(result)
+
+            if result is not None:
+                verdict = result.name
+
+            return result
+        except SystemExit:
+            verdict = "PERMISSION_DENIED"
+            raise
+        except BaseException as e:
+            verdict = type(e).__name__
+            raise
+        finally:
+            self._tracer.add(  # type: ignore
+                event, start, time.perf_counter_ns(), permission, verdict
+            )
 
 
 def add_os_getenv_audit() -> None:
@@ -164,9 +480,122 @@ def add_os_getenv_audit() -> None:
     os.environb.__class__ = _Environ
 
 
+def add_filtered_os_environ(permissions: Permissions) -> None:
+    # Alternative to `add_os_getenv_audit`: the allowed variables are copied
+    # once, reading them costs the same as reading the unpatched `os.environ`
+    # and only the other variables raise the `os.getenv` audit event
+
+    class _FilteredEnviron(os._Environ):
+        def __getitem__(self, key):
+            encoded = self.encodekey(key)
+
+            try:
+                return self.decodevalue(self._allowed[encoded])
+            except KeyError:
+                pass
+
+            sys.audit("os.getenv", key)
+            value = super().__getitem__(key)
+
+            # The hook allowed it, so the next read doesn't need to ask again
+            self._allowed[encoded] = self._data[encoded]
+            return value
+
+        def __setitem__(self, key, value):
+            super().__setitem__(key, value)
+
+            encoded = self.encodekey(key)
+            self._allowed[encoded] = self._data[encoded]
+
+        def __delitem__(self, key):
+            super().__delitem__(key)
+            self._allowed.pop(self.encodekey(key), None)
+
+    # Keys and values are stored encoded, like in `_data`, so `os.environ` and
+    # `os.environb` share it
+    allowed = {
+        key: value
+        for key, value in os.environ._data.items()  # type: ignore
+        if permissions.check_env(os.environ.decodekey(key))  # type: ignore
+    }
+
+    for environ in (os.environ, os.environb):
+        environ._allowed = allowed  # type: ignore
+        environ.__class__ = _FilteredEnviron
+
+
+def install_patches(permissions: Permissions, filter_env: bool = False) -> None:
+    # The patches only matter when there is something to check
+    if not permissions.check_all(PermissionName.ENV):
+        if filter_env:
+            add_filtered_os_environ(permissions)
+        else:
+            add_os_getenv_audit()
+
+    if not permissions.check_all(PermissionName.NET):
+        patch_socket_get_host_by_name()
+
+    if not (
+        permissions.check_all(PermissionName.READ)
+        and permissions.check_all(PermissionName.WRITE)
+    ):
+        patch_os_open_dir_fd()
+
+    if not permissions.check_all(PermissionName.RUN):
+        patch_os_posix_spawn()
+
+
+def patch_os_open_dir_fd() -> None:
+    # The `open` event of `os.open` has only the relative path, so the path
+    # it resolves to is kept for the hook until the call returns
+
+    __os_open = os.open
+
+    def _open(path, flags, mode=0o777, *, dir_fd=None):
+        if dir_fd is None:
+            return __os_open(path, flags, mode)
+
+        _open_dir_fd.pending = (path, get_dir_fd_path(dir_fd, os.fsdecode(path)))
+
+        try:
+            return __os_open(path, flags, mode, dir_fd=dir_fd)
+        finally:
+            _open_dir_fd.pending = None
+
+    # e.g. `shutil.rmtree` uses `dir_fd` only if `os.open` supports it
+    if __os_open in os.supports_dir_fd:
+        os.supports_dir_fd.add(_open)
+
+    os.open = _open
+
+
+def patch_os_posix_spawn() -> None:
+    # `posix_spawn` runs a bare name from the current directory, while the
+    # hook looks it up in PATH like `posix_spawnp` does. The name is made
+    # explicit, so both run what the hook checked
+
+    # Not available on Windows
+    if not hasattr(os, "posix_spawn"):
+        return
+
+    __os_posix_spawn = os.posix_spawn
+
+    def _posix_spawn(path, *args, **kwargs):
+        path = os.fspath(path)
+
+        if not os.path.dirname(path):
+            path = os.path.join(os.curdir if isinstance(path, str) else b".", path)
+
+        return __os_posix_spawn(path, *args, **kwargs)
+
+    os.posix_spawn = _posix_spawn
+
+
 def patch_socket_get_host_by_name() -> None:
     # This patch helps us to convert hostname to IP address
 
+    import socket
+
     __socket_getaddrinfo = socket.getaddrinfo
     __socket_gethostbyname = socket.gethostbyname
 
@@ -0,0 +1,157 @@
+import os
+from typing import IO, Any, Iterable
+
+from .hook import Hook, HookExit
+from .matcher import split_domain, split_path
+from .network import ip2host_cache, is_ip_address
+from .permission import Permission, PermissionName
+from .policy import format_policy
+from .utils import parse_address
+
+# Marks a recorded entry in the trees below, can't collide with a path
+# component or a domain label because empty ones are dropped when splitting
+_TERMINAL = ""
+
+
+def _coalesce_path(node: dict[str, Any], parts: list[str], threshold: int) -> list[str]:
+    # A recorded directory already allows everything under it
+    if _TERMINAL in node:
+        return [os.sep + os.sep.join(parts)]
+
+    paths = []
+
+    for name, child in node.items():
+        paths.extend(_coalesce_path(child, [*parts, name], threshold))
+
+    # Never coalesced into `/` or a top-level directory such as `/etc`
+    if threshold and len(paths) >= threshold and len(parts) >= 2:
+        return [os.sep + os.sep.join(parts)]
+
+    return paths
+
+
+def coalesce_paths(paths: Iterable[str], threshold: int) -> list[str]:
+    # A directory replaces its entries when there are at least `threshold` of
+    # them, counted after its subdirectories were coalesced. 0 keeps the paths
+    root: dict[str, Any] = {}
+
+    for path in paths:
+        node = root
+
+        for part in split_path(path):
+            node = node.setdefault(part, {})
+
+        node[_TERMINAL] = {}
+
+    return sorted(_coalesce_path(root, [], threshold))
+
+
+def _coalesce_domain(
+    node: dict[str, Any], labels: list[str], threshold: int
+) -> list[tuple[str, set[int | None]]]:
+    domains = []
+    ports = node.get(_TERMINAL)
+
+    if ports is not None:
+        domains.append((".".join(reversed(labels)), ports))
+
+    for label, child in node.items():
+        if label != _TERMINAL:
+            domains.extend(_coalesce_domain(child, [*labels, label], threshold))
+
+    # Never coalesced into a top-level domain such as `com`
+    if threshold and len(domains) >= threshold and len(labels) >= 2:
+        return [(".".join(reversed(labels)), set().union(*(i for _, i in domains)))]
+
+    return domains
+
+
+def coalesce_hosts(addresses: Iterable[str], threshold: int) -> list[str]:
+    # Like `coalesce_paths`, a domain allows its subdomains. IP addresses
+    # are kept as they are
+    root: dict[str, Any] = {}
+    result = set()
+
+    for address in addresses:
+        host, port = parse_address(address)
+
+        if "/" in host or is_ip_address(host):
+            result.add(address)
+            continue
+
+        node = root
+
+        for label in split_domain(host):
+            node = node.setdefault(label, {})
+
+        node.setdefault(_TERMINAL, set()).add(port)
+
+    for domain, ports in _coalesce_domain(root, [], threshold):
+        if None in ports:
+            result.add(domain)
+        else:
+            result.update(f"{domain}:{i}" for i in ports)
+
+    return sorted(result)
+
+
+class LearnHook(Hook):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+
+        self._learned: dict[PermissionName, set[str]] = {
+            i: set() for i in PermissionName
+        }
+
+    def _check_permission(self, permission: Permission) -> HookExit:
+        name, value = permission
+
+        if name is PermissionName.NET:
+            host, port = parse_address(value)  # type: ignore
+
+            # The script connects to addresses, the names they were resolved
+            # from make a policy that survives a change of the addresses
+            hosts = ip2host_cache.get(host) if is_ip_address(host) else None
+
+            if hosts:
+                self._learned[name].update(
+                    i if port is None else f"{i}:{port}" for i in hosts
+                )
+            else:
+                self._learned[name].add(value)  # type: ignore
+        else:
+            self._learned[name].add(value)  # type: ignore
+
+        if self._audit_log is not None:
+            self._audit_log.add(permission, "learned")
+
+        return HookExit.PERMISSION_OK
+
+    def policy(self, threshold: int = 8) -> dict[str, Any]:
+        allow: dict[str, list[str]] = {}
+
+        for name, values in self._learned.items():
+            # Other threads may still be running
+            values = values.copy()
+
+            if not values:
+                continue
+
+            if name in (PermissionName.READ, PermissionName.WRITE):
+                values = coalesce_paths(values, threshold)  # type: ignore
+            elif name is PermissionName.NET:
+                values = coalesce_hosts(values, threshold)  # type: ignore
+
+            # e.g. a file named `[1].txt` must not be read as a pattern
+            allow[name.value] = sorted(
+                Permission(name, i).literal().value for i in values  # type: ignore
+            )
+
+        return {"allow": allow}
+
+    def report(self, file: IO[str], threshold: int = 8) -> None:
+        # The file was opened before the hook was installed
+        format = "json" if getattr(file, "name", "").endswith(".json") else "toml"
+
+        file.write(format_policy(self.policy(threshold), format))
+        file.close()
@@ -0,0 +1,203 @@
+import _thread
+import os
+import resource
+import signal
+import sys
+import threading
+import time
+from typing import IO, Any
+
+from .utils import format_size
+
+# Limits are set with `setrlimit`, so they also apply to subprocesses, and
+# the usage is read from the kernel instead of being counted by the hook on
+# every event. Writes don't raise audit events, so the written bytes are
+# polled from `/proc/self/io`
+
+
+def _set_limit(name: int, soft: int, hard: int | None = None) -> None:
+    _, current = resource.getrlimit(name)
+
+    if hard is None:
+        hard = soft
+
+    # Only the superuser can raise the hard limit
+    if current != resource.RLIM_INFINITY:
+        soft, hard = min(soft, current), min(hard, current)
+
+    resource.setrlimit(name, (soft, hard))
+
+
+class ResourceLimits:
+    def __init__(
+        self,
+        memory: int | None = None,
+        cpu_time: int | None = None,
+        open_files: int | None = None,
+        file_size: int | None = None,
+        write_bytes: int | None = None,
+        interval: float = 0.05,
+        grace: float = 1.0,
+    ) -> None:
+        self.memory = memory
+        self.cpu_time = cpu_time
+        self.open_files = open_files
+        # `RLIMIT_FSIZE` limits the size of each file
+        self.file_size = file_size
+        # The total written by the process, to files, pipes and sockets
+        self.write_bytes = write_bytes
+        self.interval = interval
+        # How long the script may ignore the `SystemExit` of the write limit
+        self.grace = grace
+        self._io: int | None = None
+        self._exceeded = False
+        self._stop = threading.Event()
+
+    def _on_cpu_time(self, signum: int, frame: Any) -> None:
+        sys.exit(f"Exceeded the CPU time limit of {self.cpu_time} seconds")
+
+    def _on_write_bytes(self, signum: int, frame: Any) -> None:
+        # The kernel sends the same signal for `RLIMIT_FSIZE`, the write
+        # fails with `EFBIG` and the script goes on
+        if self._exceeded:
+            sys.exit(self._write_bytes_message())
+
+    def _write_bytes_message(self) -> str:
+        limit = format_size(self.write_bytes)  # type: ignore
+        return f"Exceeded the write limit of {limit}"
+
+    def _watch_written(self) -> None:
+        exceeded_at = None
+
+        while not self._stop.wait(self.interval):
+            written = self._written()
+
+            if written is None or written <= self.write_bytes:  # type: ignore
+                continue
+
+            now = time.monotonic()
+
+            if exceeded_at is None:
+                exceeded_at = now
+                self._exceeded = True
+            elif now - exceeded_at >= self.grace:
+                # The script caught the `SystemExit`, or it writes from other
+                # threads while the main one is blocked
+                os.write(2, f"{self._write_bytes_message()}\n".encode())
+                os._exit(1)
+
+            # Runs the handler in the main thread, like a real signal
+            _thread.interrupt_main(signal.SIGXFSZ)  # type: ignore
+
+    def apply(self) -> None:
+        # Opened before the hook is installed, so reading it at exit doesn't
+        # require a permission
+        try:
+            self._io = os.open("/proc/self/io", os.O_RDONLY)
+        except OSError:
+            self._io = None
+
+        if self.memory is not None:
+            _set_limit(resource.RLIMIT_AS, self.memory)
+
+        if self.cpu_time is not None:
+            # The soft limit ends the script with a message, the hard limit
+            # kills it if it's stuck in C code
+            signal.signal(signal.SIGXCPU, self._on_cpu_time)
+            _set_limit(resource.RLIMIT_CPU, self.cpu_time, self.cpu_time + 1)
+
+        if self.open_files is not None:
+            _set_limit(resource.RLIMIT_NOFILE, self.open_files)
+
+        if self.file_size is not None:
+            # Python ignores `SIGXFSZ`, so a write past the limit raises
+            # `OSError` instead of killing the script
+            _set_limit(resource.RLIMIT_FSIZE, self.file_size)
+
+        if self.write_bytes is not None:
+            if self._io is None:
+                raise ValueError("Limiting the written bytes requires /proc/self/io")
+
+            signal.signal(signal.SIGXFSZ, self._on_write_bytes)
+            threading.Thread(
+                target=self._watch_written, name="python_run-limits", daemon=True
+            ).start()
+
+    def _written(self) -> int | None:
+        if self._io is None:
+            return None
+
+        try:
+            data = os.pread(self._io, 4096, 0).decode()
+        except OSError:
+            return None
+
+        for line in data.splitlines():
+            key, _, value = line.partition(":")
+
+            if key == "wchar":
+                return int(value)
+
+        return None
+
+    def usage(self) -> dict[str, float | int | None]:
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        # `ru_maxrss` is in kilobytes, except on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+
+        try:
+            # Without the descriptors of `listdir` and of `/proc/self/io`
+            fds = os.listdir("/proc/self/fd")
+            open_files: int | None = len(fds) - 1 - (self._io is not None)
+        except OSError:
+            open_files = None
+
+        return {
+            "cpu_time": own.ru_utime
+            + own.ru_stime
+            + children.ru_utime
+            + children.ru_stime,
+            "memory": max(own.ru_maxrss, children.ru_maxrss) * scale,
+            "open_files": open_files,
+            "write_bytes": self._written(),
+        }
+
+    def summary(self) -> str:
+        usage = self.usage()
+        parts = [f"cpu time {usage['cpu_time']:.2f}s"]
+
+        if self.cpu_time is not None:
+            parts[-1] += f" / {self.cpu_time}s"
+
+        parts.append(f"peak memory {format_size(usage['memory'])}")  # type: ignore
+
+        if self.memory is not None:
+            parts[-1] += f" / {format_size(self.memory)} address space"
+
+        if usage["open_files"] is not None:
+            parts.append(f"open files at exit {usage['open_files']}")
+
+            if self.open_files is not None:
+                parts[-1] += f" / {self.open_files}"
+
+        if usage["write_bytes"] is not None:
+            parts.append(f"written {format_size(usage['write_bytes'])}")
+
+            if self.write_bytes is not None:
+                parts[-1] += f" / {format_size(self.write_bytes)}"
+
+        if self.file_size is not None:
+            parts.append(f"max file size {format_size(self.file_size)}")
+
+        return "python_run usage: " + ", ".join(parts)
+
+    def report(self, file: IO[str] | None = None) -> None:
+        print(self.summary(), file=file or sys.stderr)
+
+        self._stop.set()
+
+        if self._io is not None:
+            os.close(self._io)
+            self._io = None
@@ -0,0 +1,278 @@
+import bisect
+import ipaddress
+import os
+import re
+from typing import Any
+
+# Marks the end of an allowed path, can't collide with a path component
+# because empty components are dropped when splitting
+_TERMINAL = ""
+
+
+def split_path(path: str) -> list[str]:
+    return [i for i in path.split(os.sep) if i]
+
+
+def split_domain(domain: str) -> list[str]:
+    return [i for i in reversed(domain.lower().split(".")) if i]
+
+
+class PathTrie:
+    def __init__(self) -> None:
+        self._root: dict[str, Any] = {}
+
+    def __getstate__(self) -> dict[str, Any]:
+        return self._root
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self._root = state
+
+    def add(self, path: str) -> None:
+        node = self._root
+
+        for part in split_path(path):
+            node = node.setdefault(part, {})
+
+        node[_TERMINAL] = True
+
+    def match(self, path: str) -> bool:
+        node = self._root
+
+        if _TERMINAL in node:
+            return True
+
+        for part in path.split(os.sep):
+            if not part:
+                continue
+
+            node = node.get(part)  # type: ignore
+
+            if node is None:
+                return False
+
+            if _TERMINAL in node:
+                return True
+
+        return False
+
+
+class IPRangeSet:
+    def __init__(self) -> None:
+        # (version, port) -> unsorted (first, last) address ranges
+        self._pending: dict[tuple[int, int | None], list[tuple[int, int]]] = {}
+        # (version, port) -> merged and sorted range starts and ends
+        self._ranges: dict[tuple[int, int | None], tuple[list[int], list[int]]] = {}
+
+    def __getstate__(self) -> tuple[dict[Any, Any], dict[Any, Any]]:
+        for key in self._pending:
+            if key not in self._ranges:
+                self._build(key)
+
+        return self._pending, self._ranges
+
+    def __setstate__(self, state: tuple[dict[Any, Any], dict[Any, Any]]) -> None:
+        self._pending, self._ranges = state
+
+    def add(self, network: str, port: int | None = None) -> None:
+        net = ipaddress.ip_network(network, strict=False)
+
+        key = (net.version, port)
+        self._pending.setdefault(key, []).append(
+            (int(net.network_address), int(net.broadcast_address))
+        )
+        self._ranges.pop(key, None)
+
+    def _build(self, key: tuple[int, int | None]) -> tuple[list[int], list[int]]:
+        starts: list[int] = []
+        ends: list[int] = []
+
+        for first, last in sorted(self._pending.get(key, [])):
+            if ends and first <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], last)
+            else:
+                starts.append(first)
+                ends.append(last)
+
+        self._ranges[key] = (starts, ends)
+        return starts, ends
+
+    def _match(self, key: tuple[int, int | None], ip: int) -> bool:
+        if key not in self._pending:
+            return False
+
+        try:
+            starts, ends = self._ranges[key]
+        except KeyError:
+            starts, ends = self._build(key)
+
+        i = bisect.bisect_right(starts, ip) - 1
+        return i >= 0 and ip <= ends[i]
+
+    def match(self, ip: str, port: int | None = None) -> bool:
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+
+        value = int(addr)
+
+        return self._match((addr.version, None), value) or (
+            port is not None and self._match((addr.version, port), value)
+        )
+
+
+class DomainTrie:
+    def __init__(self) -> None:
+        self._root: dict[str, Any] = {}
+
+    def __getstate__(self) -> dict[str, Any]:
+        return self._root
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self._root = state
+
+    def add(self, domain: str, port: int | None = None) -> None:
+        node = self._root
+
+        for label in split_domain(domain):
+            node = node.setdefault(label, {})
+
+        # `None` in the ports set allows any port
+        node.setdefault(_TERMINAL, set()).add(port)
+
+    def match(self, host: str, port: int | None = None) -> bool:
+        node = self._root
+
+        for label in split_domain(host):
+            node = node.get(label)  # type: ignore
+
+            if node is None:
+                return False
+
+            ports = node.get(_TERMINAL)
+
+            if ports is not None and (None in ports or port in ports):
+                return True
+
+        return False
+
+
+def is_pattern(value: str) -> bool:
+    return any(i in value for i in "*?[")
+
+
+def escape_pattern(value: str) -> str:
+    return re.sub(r"([*?[])", r"[\1]", value)
+
+
+def translate_pattern(pattern: str, sep: str | None = os.sep) -> str:
+    # Like `fnmatch.translate`, but `*` and `?` don't match the separator and
+    # `**` matches any number of path components
+    any_ = "." if sep is None else f"[^{re.escape(sep)}]"
+
+    i, n = 0, len(pattern)
+    res = []
+
+    while i < n:
+        c = pattern[i]
+        i += 1
+
+        if c == "*":
+            if sep is not None and pattern[i : i + 1] == "*":
+                i += 1
+
+                if pattern[i : i + 1] == sep:
+                    i += 1
+                    res.append(f"(?:.*{re.escape(sep)})?")
+                else:
+                    res.append(".*")
+            else:
+                res.append(f"{any_}*")
+        elif c == "?":
+            res.append(any_)
+        elif c == "[":
+            # A `]` right after `[` or `[!` is part of the set, like in `fnmatch`
+            j = i
+
+            if pattern[j : j + 1] == "!":
+                j += 1
+
+            if pattern[j : j + 1] == "]":
+                j += 1
+
+            j = pattern.find("]", j)
+
+            if j == -1:
+                res.append(re.escape(c))
+                continue
+
+            chars = pattern[i:j].replace("\\", "\\\\").replace("[", "\\[")
+            i = j + 1
+
+            if chars[0] == "!":
+                chars = "^" + chars[1:]
+            elif chars[0] == "^":
+                chars = "\\" + chars
+
+            res.append(f"[{chars}]")
+        else:
+            res.append(re.escape(c))
+
+    return "".join(res)
+
+
+class PatternSet:
+    def __init__(self, sep: str | None = os.sep, prefix: bool = False) -> None:
+        self._sep = sep
+        # Whether a pattern also matches everything under the paths it matches
+        self._prefix = prefix
+        self._patterns: list[str] = []
+        self._regex: re.Pattern[str] | None = None
+
+    def __getstate__(self) -> list[str]:
+        return self._patterns
+
+    def __setstate__(self, state: list[str]) -> None:
+        self._patterns = state
+        self._regex = None
+
+    def add(self, pattern: str) -> None:
+        # Fails now rather than in the hook, e.g. a range such as `[z-a]`
+        try:
+            re.compile(translate_pattern(pattern, self._sep))
+        except re.error as e:
+            raise ValueError(f"Invalid pattern {pattern!r}: {e}") from None
+
+        self._patterns.append(pattern)
+        self._regex = None
+
+    def _compile(self) -> re.Pattern[str]:
+        # All the patterns are combined into a single regex, so a check is
+        # a single match call no matter how many patterns there are
+        alternatives = []
+
+        for pattern in self._patterns:
+            regex = translate_pattern(pattern, self._sep)
+
+            if self._sep is not None and self._sep not in pattern:
+                # Matches the file name in any directory, e.g. `*.parquet`
+                regex = f"(?:.*{re.escape(self._sep)})?{regex}"
+
+            alternatives.append(f"(?:{regex})")
+
+        suffix = ""
+
+        if self._prefix and self._sep is not None:
+            # A pattern also matches everything under what it matches
+            suffix = f"(?:{re.escape(self._sep)}.*)?"
+
+        self._regex = re.compile(f"(?s:{'|'.join(alternatives)}){suffix}")
+        return self._regex
+
+    def match(self, value: str) -> bool:
+        if not self._patterns:
+            return False
+
+        regex = self._regex or self._compile()
+
+        return regex.fullmatch(value) is not None
@@ -1,6 +1,13 @@
 import ipaddress
-import socket
-import urllib.request
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable
+
+# `socket`, `urllib.request` and friends are imported only by the functions
+# that need them, most runs never download anything or resolve a hostname
 
 
 def is_ip_address(value: str) -> bool:
@@ -12,6 +19,8 @@ def is_ip_address(value: str) -> bool:
 
 
 def host2ip(host: str, port: int | None = None) -> str | None:
+    import socket
+
     try:
         for *_, addr in socket.getaddrinfo(host, port):
             return addr[0]
@@ -19,13 +28,251 @@ def host2ip(host: str, port: int | None = None) -> str | None:
         pass
 
 
-ip2host_cache: dict[str, str] = {}
+class HostCache:
+    def __init__(self, maxsize: int = 4096, ttl: float = 300.0) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        # ip -> {hostname: expiry}, ordered from least to most recently updated
+        self._data: OrderedDict[str, dict[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, ip: object) -> bool:
+        return bool(self.get(ip))  # type: ignore
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def add(self, ip: str, host: str, ttl: float | None = None) -> None:
+        # `getaddrinfo` doesn't expose the TTL of the DNS records,
+        # so unless one is given we fall back to the default
+        expires = time.monotonic() + (self._ttl if ttl is None else ttl)
+
+        with self._lock:
+            hosts = self._data.get(ip)
+
+            if hosts is None:
+                hosts = self._data[ip] = {}
+            else:
+                self._data.move_to_end(ip)
+
+            hosts[host] = expires
+
+            if len(self._data) > self._maxsize:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Addresses of the allowlist never expire, so they are never evicted
+        # either, otherwise a busy script could make them unresolvable
+        for ip, hosts in self._data.items():
+            if math.inf not in hosts.values():
+                del self._data[ip]
+                return
+
+    def get(self, ip: str) -> set[str]:
+        hosts = self._data.get(ip)
+
+        if not hosts:
+            return set()
+
+        now = time.monotonic()
+
+        with self._lock:
+            for host, expires in list(hosts.items()):
+                if expires <= now:
+                    del hosts[host]
+
+            if not hosts:
+                self._data.pop(ip, None)
+
+            return set(hosts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+ip2host_cache = HostCache()
+
+
+def get_host_ips(host: str) -> set[str]:
+    import socket
+
+    try:
+        return {addr[0] for *_, addr in socket.getaddrinfo(host, None)}
+    except (OSError, UnicodeError):
+        return set()
+
+
+def resolve_hosts(
+    hosts: Iterable[str],
+    timeout: float,
+    resolver: Callable[[str], set[str]] = get_host_ips,
+    cache: HostCache = ip2host_cache,
+    max_workers: int = 16,
+) -> dict[str, set[str]]:
+    # Resolves the hosts in parallel and adds their addresses to the cache,
+    # so connecting to them never waits for a lookup in the hook. A lookup
+    # that is still running after the timeout doesn't delay the script,
+    # the threads are daemons and add their results whenever they finish
+    unique = list(dict.fromkeys(hosts))
+    pending = iter(unique)
+    results: dict[str, set[str]] = {}
+    lock = threading.Lock()
+
+    def worker() -> None:
+        while True:
+            with lock:
+                host = next(pending, None)
+
+            if host is None:
+                return
+
+            ips = resolver(host)
+
+            for ip in ips:
+                # The allowlist is trusted for the whole run, addresses the
+                # script resolves itself still use the default TTL
+                cache.add(ip, host, ttl=math.inf)
+
+            with lock:
+                results[host] = ips
+
+    threads = [
+        threading.Thread(target=worker, name="python_run-resolver", daemon=True)
+        for _ in range(min(max_workers, len(unique)))
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    deadline = time.monotonic() + timeout
+
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    with lock:
+        return dict(results)
 
 
 def download_file(url: str) -> bytes:
+    import urllib.request
+
     with urllib.request.urlopen(url) as response:
         return response.read()
 
 
 def is_remote_file(file: str) -> bool:
     return file.startswith("http://") or file.startswith("https://")
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    import tempfile
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+
+    with os.fdopen(fd, "wb") as fp:
+        fp.write(data)
+
+    os.replace(tmp, path)
+
+
+def _read_index_entry(path: str) -> dict[str, str] | None:
+    import json
+
+    try:
+        with open(path) as fp:
+            entry = json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+    # A corrupt entry is a cache miss, like a missing blob
+    if not isinstance(entry, dict) or not all(
+        isinstance(entry.get(i, ""), str) for i in ("sha256", "etag", "last_modified")
+    ):
+        return None
+
+    digest = entry.get("sha256", "")
+
+    # It's part of a path, e.g. `../` must not get out of the blobs directory
+    if len(digest) != 64 or digest.strip("0123456789abcdef"):
+        return None
+
+    return entry
+
+
+def fetch_remote_file(
+    url: str, cache_dir: str, reload: bool = False, offline: bool = False
+) -> str:
+    # Downloads are stored by the SHA-256 of their content, and each URL has
+    # an index entry that points to its latest content and HTTP validators
+
+    import hashlib
+    import json
+    import tempfile
+    import urllib.error
+    import urllib.request
+
+    blobs_dir = os.path.join(cache_dir, "remote", "blobs")
+    urls_dir = os.path.join(cache_dir, "remote", "urls")
+
+    os.makedirs(blobs_dir, exist_ok=True)
+    os.makedirs(urls_dir, exist_ok=True)
+
+    index = os.path.join(urls_dir, hashlib.sha256(url.encode()).hexdigest())
+
+    entry = _read_index_entry(index)
+
+    if entry is not None:
+        blob = os.path.join(blobs_dir, entry["sha256"] + ".py")
+
+        if not os.path.exists(blob):
+            entry = None
+        elif offline or not reload:
+            return blob
+
+    if offline:
+        raise FileNotFoundError(f"{url} is not in the cache")
+
+    headers = {}
+
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    request = urllib.request.Request(url, headers=headers)
+
+    try:
+        response = urllib.request.urlopen(request)
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and entry is not None:
+            return os.path.join(blobs_dir, entry["sha256"] + ".py")
+        raise
+
+    with response:
+        hash_ = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=blobs_dir)
+
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                while chunk := response.read(64 * 1024):
+                    hash_.update(chunk)
+                    fp.write(chunk)
+
+            blob = os.path.join(blobs_dir, hash_.hexdigest() + ".py")
+            os.replace(tmp, blob)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        entry = {
+            "url": url,
+            "sha256": hash_.hexdigest(),
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", ""),
+        }
+
+    _write_atomic(index, json.dumps(entry).encode())
+
+    return blob
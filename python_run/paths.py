@@ -0,0 +1,101 @@
+import os
+import threading
+from typing import Any
+
+_ACCMODE = getattr(os, "O_ACCMODE", os.O_RDONLY | os.O_WRONLY | os.O_RDWR)
+
+# Flags that change the file even when it's opened only for reading
+_WRITE_FLAGS = os.O_CREAT | os.O_TRUNC | os.O_APPEND
+
+_PROC_FD = "/proc/self/fd"
+
+
+def get_open_access(mode: str | None, flags: int | None) -> tuple[bool, bool]:
+    # Returns whether the file is opened for (reading, writing). `open` passes
+    # both a mode string and the flags it computed from it, `os.open` passes
+    # only the flags
+    if isinstance(flags, int):
+        access = flags & _ACCMODE
+
+        return (
+            access in (os.O_RDONLY, os.O_RDWR),
+            access in (os.O_WRONLY, os.O_RDWR) or bool(flags & _WRITE_FLAGS),
+        )
+
+    if not mode:
+        return False, False
+
+    return (
+        "r" in mode or "+" in mode,
+        any(i in mode for i in "wax+"),
+    )
+
+
+def get_dir_fd_path(dir_fd: int, path: str) -> str | None:
+    # The kernel keeps the path of every open descriptor, `realpath` follows it
+    if not os.path.isdir(_PROC_FD):
+        return None
+
+    return os.path.realpath(os.path.join(_PROC_FD, str(dir_fd), path))
+
+
+class PathResolver:
+    def __init__(self, maxsize: int = 4096) -> None:
+        self._maxsize = maxsize
+        # Absolute directory -> its real path
+        self._dirs: dict[str, str] = {}
+        # Absolute path, as it was opened -> its real path
+        self._files: dict[Any, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._dirs)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dirs.clear()
+            self._files.clear()
+
+    def _add(self, cache: dict[Any, str], key: Any, value: str) -> None:
+        with self._lock:
+            if len(cache) >= self._maxsize:
+                cache.clear()
+
+            cache[key] = value
+
+    def realpath(self, path: Any) -> str:
+        # Opening the same file again costs a single lookup
+        try:
+            return self._files[path]
+        except (KeyError, TypeError):
+            pass
+
+        key = path
+        path = os.fsdecode(path)
+
+        # `abspath` removes `..` without looking at the file system, which is
+        # wrong when it follows a symlink
+        if ".." in path.split(os.sep):
+            return os.path.realpath(path)
+
+        absolute = os.path.isabs(path)
+        path = os.path.abspath(path)
+        dir, name = os.path.split(path)
+
+        real_dir = self._dirs.get(dir)
+
+        if real_dir is None:
+            real_dir = os.path.realpath(dir)
+            self._add(self._dirs, dir, real_dir)
+
+        path = os.path.join(real_dir, name)
+
+        # The file itself costs a single `lstat`
+        if os.path.islink(path):
+            path = os.path.realpath(path)
+
+        # Relative paths depend on the current directory
+        if absolute:
+            self._add(self._files, key, path)
+
+        return path
@@ -1,7 +1,17 @@
 import enum
 import os
-from typing import NamedTuple, Type
-
+from collections import OrderedDict
+from typing import Any, NamedTuple, Type
+
+from .executable import resolve_executable
+from .matcher import (
+    DomainTrie,
+    IPRangeSet,
+    PathTrie,
+    PatternSet,
+    escape_pattern,
+    is_pattern,
+)
 from .network import ip2host_cache, is_ip_address
 from .utils import parse_address
 
@@ -13,6 +23,9 @@ class PermissionName(str, enum.Enum):
     WRITE = "write"
     RUN = "run"
 
+    # Python 3.11 changed `format()` of mixed-in enums to use `Enum.__str__`
+    __str__ = str.__str__
+
 
 class PermissionAll:
     pass
@@ -25,26 +38,138 @@ class Permission(NamedTuple):
     name: PermissionName
     value: PermissonValue
 
+    def literal(self) -> "Permission":
+        # Values requested by the script are granted as is, even if they
+        # look like a pattern
+        if (
+            self.name in PATTERN_PERMISSIONS
+            and isinstance(self.value, str)
+            and is_pattern(self.value)
+        ):
+            return Permission(self.name, escape_pattern(self.value))
+
+        return self
+
+
+PATTERN_PERMISSIONS = {
+    PermissionName.ENV,
+    PermissionName.READ,
+    PermissionName.WRITE,
+    PermissionName.RUN,
+}
+
+
+def is_name_pattern(value: str) -> bool:
+    # Patterns without a directory, like `*.parquet`, match in any directory
+    return os.sep not in value and is_pattern(value)
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
 
 class Permissions:
-    def __init__(self) -> None:
+    def __init__(self, cache_size: int = 4096) -> None:
         self._permissions: set[Permission] = set()
+        self._cache: OrderedDict[Permission, bool] = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._paths: dict[PermissionName, PathTrie] = {
+            PermissionName.READ: PathTrie(),
+            PermissionName.WRITE: PathTrie(),
+        }
+        self._patterns: dict[PermissionName, PatternSet] = {
+            PermissionName.ENV: PatternSet(sep=None),
+            PermissionName.READ: PatternSet(prefix=True),
+            PermissionName.WRITE: PatternSet(prefix=True),
+            PermissionName.RUN: PatternSet(),
+        }
+        self._networks = IPRangeSet()
+        self._domains = DomainTrie()
+
+    # The state only contains builtin types, so it can be stored with `marshal`
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {
+            "cache_size": self._cache_size,
+            "permissions": [
+                (
+                    name.value,
+                    [
+                        None if value is PermissionAll else value
+                        for name_, value in self._permissions
+                        if name_ is name
+                    ],
+                )
+                for name in PermissionName
+            ],
+            "paths": {
+                name.value: trie.__getstate__() for name, trie in self._paths.items()
+            },
+            "patterns": {
+                name.value: patterns.__getstate__()
+                for name, patterns in self._patterns.items()
+            },
+            "networks": self._networks.__getstate__(),
+            "domains": self._domains.__getstate__(),
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(state["cache_size"])  # type: ignore
+
+        for key, values in state["permissions"]:
+            name = PermissionName(key)
+
+            self._permissions.update(
+                Permission(name, PermissionAll if value is None else value)
+                for value in values
+            )
+
+        for name, root in state["paths"].items():
+            self._paths[PermissionName(name)].__setstate__(root)
+
+        for name, patterns in state["patterns"].items():
+            self._patterns[PermissionName(name)].__setstate__(patterns)
+
+        self._networks.__setstate__(state["networks"])
+        self._domains.__setstate__(state["domains"])
 
     def _check(self, permission: Permission, full_match: bool = True) -> bool:
-        if Permission(permission.name, PermissionAll) in self._permissions:
+        name, value = permission
+
+        if Permission(name, PermissionAll) in self._permissions:
             return True
 
         if full_match:
-            return permission in self._permissions
+            if permission in self._permissions:
+                return True
+        elif self._paths[name].match(value):  # type: ignore
+            return True
 
-        return any(
-            perm == permission.name and permission.value.startswith(val)  # type: ignore
-            for perm, val in self._permissions
-        )
+        patterns = self._patterns.get(name)
+
+        return patterns is not None and patterns.match(value)  # type: ignore
 
     def _allow(self, permission: Permission) -> None:
         self._permissions.add(permission)
 
+        # A new grant can turn a cached denial into an approval
+        self._cache.clear()
+
+        name, value = permission
+
+        if value is PermissionAll:
+            return
+
+        if name in self._patterns and is_pattern(value):  # type: ignore
+            self._patterns[name].add(value)  # type: ignore
+        elif name in self._paths:
+            self._paths[name].add(value)  # type: ignore
+
     def allow(self, permission: Permission) -> None:
         name, value = permission
 
@@ -65,32 +190,106 @@ class Permissions:
 
     def allow_net(self, value: PermissonValue) -> None:
         if value is PermissionAll:
-            self._permissions.add(Permission(PermissionName.NET, PermissionAll))
+            self._allow(Permission(PermissionName.NET, PermissionAll))
             return
 
         host, port = parse_address(value)  # type: ignore
 
+        if "/" in host or is_ip_address(host):
+            self._networks.add(host, port)
+        else:
+            self._domains.add(host, port)
+
         if port is not None:
-            self._permissions.add(Permission(PermissionName.NET, f"{host}:{port}"))
+            self._allow(Permission(PermissionName.NET, f"{host}:{port}"))
         else:
-            self._permissions.add(Permission(PermissionName.NET, host))
+            self._allow(Permission(PermissionName.NET, host))
 
-    def allow_read(self, value: PermissonValue) -> None:
-        if value is not PermissionAll:
-            value = os.path.abspath(value)
+    def _allow_path(self, name: PermissionName, value: PermissonValue) -> None:
+        if not isinstance(value, str) or is_name_pattern(value):
+            self._allow(Permission(name, value))
+            return
 
-        self._allow(Permission(PermissionName.READ, value))
+        absolute = os.path.abspath(value)
+        self._allow(Permission(name, absolute))
 
-    def allow_write(self, value: PermissonValue) -> None:
-        if value is not PermissionAll:
-            value = os.path.abspath(value)
+        # The hook checks paths with their symlinks resolved, e.g. `/tmp`
+        # is `/private/tmp` on macOS
+        if not is_pattern(absolute):
+            path = os.path.realpath(absolute)
 
-        self._allow(Permission(PermissionName.WRITE, value))
+            if path != absolute:
+                self._allow(Permission(name, path))
+
+    def allow_read(self, value: PermissonValue) -> None:
+        self._allow_path(PermissionName.READ, value)
+
+    def allow_write(self, value: PermissonValue) -> None:
+        self._allow_path(PermissionName.WRITE, value)
 
     def allow_run(self, value: PermissonValue) -> None:
         self._allow(Permission(PermissionName.RUN, value))
 
+        # Executables are checked by their real path, e.g. `git` allows
+        # `/usr/bin/git` but not another `git` earlier in a modified PATH
+        if value is not PermissionAll and not is_pattern(value):  # type: ignore
+            path = resolve_executable(value)  # type: ignore
+
+            if path != value:
+                self._allow(Permission(PermissionName.RUN, path))
+
+    def net_hosts(self) -> list[str]:
+        # The hostnames allowed by `allow_net`, without IP addresses or networks
+        hosts = []
+
+        for name, value in self._permissions:
+            if name is not PermissionName.NET or value is PermissionAll:
+                continue
+
+            host, _ = parse_address(value)  # type: ignore
+
+            if "/" not in host and not is_ip_address(host):
+                hosts.append(host)
+
+        return sorted(set(hosts))
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(
+            self._cache_hits, self._cache_misses, self._cache_size, len(self._cache)
+        )
+
     def check(self, permission: Permission) -> bool:
+        try:
+            verdict = self._cache[permission]
+        except KeyError:
+            self._cache_misses += 1
+        else:
+            self._cache_hits += 1
+
+            try:
+                self._cache.move_to_end(permission)
+            except KeyError:  # evicted by another thread
+                pass
+
+            return verdict
+
+        if permission.name == PermissionName.NET:
+            verdict, cacheable = self._check_net(permission.value)
+        else:
+            verdict, cacheable = self._check_uncached(permission), True
+
+        if self._cache_size > 0 and cacheable:
+            self._cache[permission] = verdict
+
+            if len(self._cache) > self._cache_size:
+                try:
+                    self._cache.popitem(last=False)
+                except KeyError:
+                    pass
+
+        return verdict
+
+    def _check_uncached(self, permission: Permission) -> bool:
         name, value = permission
 
         match name:
@@ -105,33 +304,39 @@ class Permissions:
             case PermissionName.RUN:
                 return self.check_run(value)
 
+    def check_all(self, name: PermissionName) -> bool:
+        return Permission(name, PermissionAll) in self._permissions
+
     def check_env(self, value: PermissonValue) -> bool:
         return self._check(Permission(PermissionName.ENV, value))
 
     def check_net(self, value: PermissonValue) -> bool:
+        return self._check_net(value)[0]
+
+    def _check_net(self, value: PermissonValue) -> tuple[bool, bool]:
+        # Returns the verdict and whether it can be cached. Verdicts that
+        # depend on `ip2host_cache` are not, its entries expire and keep
+        # changing while the script runs
         if Permission(PermissionName.NET, PermissionAll) in self._permissions:
-            return True
+            return True, True
 
         host, port = parse_address(value)  # type: ignore
 
         if is_ip_address(host):
-            if host in ip2host_cache:
-                host_ = ip2host_cache[host]
-
-                for perm in self._permissions:
-                    if perm.name is PermissionName.NET and (
-                        perm.value == host_
-                        or perm.value == f"{host_}:{port}"
-                        or host_.endswith(f".{perm.value}")
-                        or host_.endswith(f".{perm.value}:{port}")
-                    ):
-                        return True
-
-        return (
+            if self._networks.match(host, port):
+                return True, True
+
+            for host_ in ip2host_cache.get(host):
+                if self._domains.match(host_, port):
+                    return True, False
+
+        verdict = (
             Permission(PermissionName.NET, host) in self._permissions
             or Permission(PermissionName.NET, value) in self._permissions
         )
 
+        return verdict, verdict
+
     def check_read(self, value: PermissonValue) -> bool:
         return self._check(Permission(PermissionName.READ, value), full_match=False)
 
@@ -0,0 +1,151 @@
+import marshal
+import os
+import sys
+from typing import Any
+
+from .permission import (
+    Permission,
+    PermissionAll,
+    PermissionName,
+    Permissions,
+    is_name_pattern,
+)
+
+# `argparse` and `json` are imported only by the functions that need them,
+# child processes load the snapshot of their parent on startup
+
+# Compiled snapshots hold the already indexed matchers of `Permissions`, the
+# marshal format can change between Python versions so it's part of the header,
+# next to the version of the state of `Permissions`
+SNAPSHOT_VERSION = 1
+SNAPSHOT_MAGIC = b"PYRUNPOL" + bytes([SNAPSHOT_VERSION, *sys.version_info[:2]])
+
+
+def parse_policy(data: dict[str, Any], base_dir: str = ".") -> Permissions:
+    permissions = Permissions()
+
+    allow = data.get("allow", {})
+
+    if not isinstance(allow, dict):
+        raise ValueError("'allow' must be a table")
+
+    for key, value in allow.items():
+        if key == "all":
+            if value is True:
+                for name in PermissionName:
+                    permissions.allow(Permission(name, PermissionAll))
+            continue
+
+        try:
+            name = PermissionName(key)
+        except ValueError:
+            raise ValueError(f"Unknown permission {key!r}") from None
+
+        if value is True:
+            permissions.allow(Permission(name, PermissionAll))
+        elif isinstance(value, list) and all(isinstance(i, str) for i in value):
+            for i in value:
+                # Relative paths are relative to the policy file
+                path = name in (PermissionName.READ, PermissionName.WRITE)
+
+                if path and not is_name_pattern(i):
+                    i = os.path.join(base_dir, i)
+
+                permissions.allow(Permission(name, i))
+        elif value is not False:
+            raise ValueError(f"{key!r} must be true, false or a list of strings")
+
+    return permissions
+
+
+def load_snapshot(data: bytes) -> Permissions:
+    if not data.startswith(SNAPSHOT_MAGIC):
+        raise ValueError(
+            "Snapshot was compiled by another version of Python or python_run"
+        )
+
+    try:
+        state = marshal.loads(data[len(SNAPSHOT_MAGIC) :])
+    except (EOFError, TypeError) as e:
+        raise ValueError(f"Corrupted snapshot: {e}") from None
+
+    permissions = Permissions.__new__(Permissions)
+
+    try:
+        permissions.__setstate__(state)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"Corrupted snapshot: {e!r}") from None
+
+    return permissions
+
+
+def dump_snapshot(permissions: Permissions) -> bytes:
+    return SNAPSHOT_MAGIC + marshal.dumps(permissions.__getstate__())
+
+
+def load_policy(file: str) -> Permissions:
+    with open(file, "rb") as fp:
+        data = fp.read()
+
+    if data.startswith(SNAPSHOT_MAGIC[:8]):
+        return load_snapshot(data)
+
+    base_dir = os.path.dirname(os.path.abspath(file))
+
+    if file.endswith(".json"):
+        import json
+
+        return parse_policy(json.loads(data), base_dir)
+
+    try:
+        import tomllib
+    except ImportError:  # pragma: no cover
+        raise ValueError("TOML policies require Python 3.11 or newer") from None
+
+    return parse_policy(tomllib.loads(data.decode()), base_dir)
+
+
+def format_policy(data: dict[str, Any], format: str = "toml") -> str:
+    import json
+
+    if format == "json":
+        return json.dumps(data, indent=4) + "\n"
+
+    # Only what `parse_policy` reads, JSON strings are valid TOML basic strings
+    lines = ["[allow]"]
+
+    for key, value in data.get("allow", {}).items():
+        if isinstance(value, bool):
+            lines.append(f"{key} = {str(value).lower()}")
+        else:
+            lines.append(f"{key} = [")
+            lines.extend(f"    {json.dumps(i, ensure_ascii=False)}," for i in value)
+            lines.append("]")
+
+    return "\n".join(lines) + "\n"
+
+
+def main() -> None:
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m python_run.policy",
+        description="Compile a policy file into a snapshot that loads faster.",
+    )
+
+    arg_parser.add_argument("policy", help="TOML or JSON policy file.")
+    arg_parser.add_argument("output", help="Snapshot file to write.")
+
+    opts = arg_parser.parse_args()
+
+    try:
+        permissions = load_policy(opts.policy)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Cannot load policy {opts.policy!r}: {e}")
+
+    with open(opts.output, "wb") as fp:
+        fp.write(dump_snapshot(permissions))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,143 @@
+import os
+import sys
+from typing import TYPE_CHECKING
+
+from .permission import Permissions
+from .policy import dump_snapshot, load_snapshot
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .broker import BrokerClient
+
+# Child processes find the snapshot of the permissions through the
+# environment, and load it in the `sitecustomize` of the bootstrap directory
+
+ENV_POLICY = "PYTHON_RUN_POLICY"
+ENV_FILE = "PYTHON_RUN_FILE"
+
+BOOTSTRAP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_bootstrap")
+
+
+class PolicyFile:
+    def __init__(self, path: str, read_only: bool = False) -> None:
+        self.path = path
+        # Children load it but keep their grants to themselves, they would
+        # overwrite the ones the parent made after they started
+        self.read_only = read_only
+        self._pid = os.getpid()
+
+    def write(self, permissions: Permissions) -> None:
+        # Replaced atomically, children may be loading it at the same time
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+
+        with open(tmp, "wb") as fp:
+            fp.write(dump_snapshot(permissions))
+
+        os.replace(tmp, self.path)
+
+    def remove(self) -> None:
+        import shutil
+
+        # Forked children exit with the parent's `atexit` handlers
+        if os.getpid() == self._pid:
+            shutil.rmtree(os.path.dirname(self.path), ignore_errors=True)
+
+
+def propagate(
+    file: str, permissions: Permissions, broker: str | None = None
+) -> PolicyFile:
+    import tempfile
+
+    # Removed by the hook at exit, the script can't remove it
+    dir = tempfile.mkdtemp(prefix="python_run-")
+
+    policy_file = PolicyFile(os.path.join(dir, "policy"))
+    policy_file.write(permissions)
+
+    package_dir = os.path.dirname(os.path.dirname(BOOTSTRAP_DIR))
+    python_path = os.environ.get("PYTHONPATH")
+
+    os.environ[ENV_POLICY] = policy_file.path
+    os.environ[ENV_FILE] = file
+    os.environ["PYTHONPATH"] = os.pathsep.join(
+        [BOOTSTRAP_DIR, package_dir, *([python_path] if python_path else [])]
+    )
+
+    # Children ask the same broker, otherwise they can't prompt
+    if broker:
+        os.environ["PYTHON_RUN_BROKER"] = broker
+
+    return policy_file
+
+
+def _run_customize_modules() -> None:
+    # Ours shadows the `sitecustomize` the child would have loaded otherwise
+    module = sys.modules.pop("sitecustomize", None)
+    path = sys.path[:]
+
+    sys.path[:] = [i for i in path if os.path.abspath(i or ".") != BOOTSTRAP_DIR]
+
+    try:
+        import sitecustomize  # type: ignore # noqa: F401
+    except ImportError:
+        pass
+    finally:
+        sys.path[:] = path
+
+        if module is not None and "sitecustomize" not in sys.modules:
+            sys.modules["sitecustomize"] = module
+
+    import site
+
+    # `site` runs it after us, its `import` would make the hook skip the next
+    # `open` when there is no `usercustomize` to open
+    if site.ENABLE_USER_SITE:
+        site.execusercustomize()
+        site.execusercustomize = lambda: None
+
+
+def install_child() -> None:
+    path = os.environ.get(ENV_POLICY)
+
+    if not path:
+        _run_customize_modules()
+        return
+
+    from . import hook
+
+    # A child that can't load the permissions must not run without them
+    try:
+        with open(path, "rb") as fp:
+            permissions = load_snapshot(fp.read())
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"python_run: cannot load the permissions {path!r}: {e}\n")
+        sys.stderr.flush()
+        os._exit(1)
+
+    broker: "BrokerClient | None" = None
+    broker_path = os.environ.get("PYTHON_RUN_BROKER")
+
+    if broker_path:
+        from .broker import BrokerClient
+
+        try:
+            broker = BrokerClient(broker_path)
+        except OSError:
+            broker = None
+
+    if broker is None:
+        # Children share the terminal of the parent, often many at once
+        hook.PYTHON_NO_PROMPT = True
+
+    hook.install_patches(permissions)
+
+    hook_ = hook.Hook(
+        os.environ.get(ENV_FILE, ""),
+        permissions,
+        broker=broker,
+        policy_file=PolicyFile(path, read_only=True),
+    )
+    sys.addaudithook(hook_)
+
+    # They are the child's code as much as the script is
+    _run_customize_modules()
+    hook_.reset_imports()
@@ -0,0 +1,166 @@
+import argparse
+import atexit
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+import urllib.request  # noqa: F401
+
+# The modules that `run` imports lazily are imported once for all the jobs
+from . import (  # noqa: F401
+    audit_log,
+    broker,
+    bytecode,
+    hook,
+    learn,
+    limits,
+    policy,
+    propagate,
+    stats,
+    trace,
+)
+from .__main__ import parse_args, run
+from .client import HEADER, recv_exactly
+from .utils import is_env_set
+
+
+def _exit_code(e: SystemExit) -> int:
+    if e.code is None:
+        return 0
+
+    if isinstance(e.code, int):
+        return e.code
+
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+def _run_job(conn: socket.socket) -> int:
+    data, fds, _, _ = socket.recv_fds(conn, HEADER.size, 3)
+    (size,) = HEADER.unpack(data)
+    job = json.loads(recv_exactly(conn, size))
+
+    for fd, target in zip(fds, (0, 1, 2)):
+        os.dup2(fd, target)
+        os.close(fd)
+
+    os.chdir(job["cwd"])
+
+    os.environ.clear()
+    os.environ.update(job["env"])
+
+    # Was read from the environment of the server when it was imported
+    hook.PYTHON_NO_PROMPT = is_env_set("PYTHON_NO_PROMPT")
+
+    sys.argv = [sys.argv[0], *job["argv"]]
+
+    try:
+        run(*parse_args(job["argv"]))
+    except SystemExit as e:
+        return _exit_code(e)
+    except BaseException:
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+def _worker(listener: socket.socket) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    code = 1
+
+    try:
+        conn, _ = listener.accept()
+        listener.close()
+
+        with conn:
+            try:
+                code = _run_job(conn) & 0xFF
+            except BaseException:
+                pass
+
+            # The handlers registered by the job (e.g. `--trace`) must run
+            # before the client is told that the job is done
+            atexit._run_exitfuncs()
+
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+            conn.sendall(HEADER.pack(code))
+    finally:
+        # Never return into the server loop of the parent
+        os._exit(code)
+
+
+def serve(path: str, workers: int) -> None:
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Only the owner may connect, like the broker's socket
+    umask = os.umask(0o177)
+
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(umask)
+
+    listener.listen(128)
+
+    children: set[int] = set()
+
+    def spawn() -> None:
+        pid = os.fork()
+
+        if pid == 0:  # pragma: no cover
+            _worker(listener)
+
+        children.add(pid)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    try:
+        for _ in range(workers):
+            spawn()
+
+        # Each worker runs a single job, then it is replaced by a new one
+        while True:
+            pid, _ = os.wait()
+            children.discard(pid)
+            spawn()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        listener.close()
+        os.unlink(path)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m python_run.server",
+        description="Run python_run jobs in pre-forked workers, "
+        "use `python -m python_run.client SOCKET FILE [ARGS...]` to submit them.",
+    )
+
+    arg_parser.add_argument("socket", help="Path of the Unix socket to listen on.")
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of idle workers to keep ready (default: number of CPUs).",
+    )
+
+    opts = arg_parser.parse_args()
+
+    serve(opts.socket, opts.workers)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
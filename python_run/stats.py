@@ -0,0 +1,99 @@
+import json
+import sys
+import time
+from typing import IO, Any
+
+from .hook import Hook, HookExit
+from .permission import Permission
+
+# The counters live in a subclass, so runs without --stats don't pay for them.
+# They are updated without a lock, concurrent events may rarely be lost
+
+
+class StatsHook(Hook):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+
+        self._start = time.perf_counter_ns()
+        self._time = 0
+        self._events: dict[str, int] = {}
+        self._checks: dict[str, int] = {}
+        self._asked = 0
+        self._denied = 0
+
+    def _check_permission(self, permission: Permission) -> HookExit:
+        name = permission.name.value
+        self._checks[name] = self._checks.get(name, 0) + 1
+
+        try:
+            result = super()._check_permission(permission)
+        except SystemExit:
+            self._asked += 1
+            self._denied += 1
+            raise
+
+        if result is HookExit.PERMISSION_GRANTED:
+            self._asked += 1
+
+        return result
+
+    def __call__(self, event: str, args: tuple[Any, ...]) -> HookExit | None:
+        start = time.perf_counter_ns()
+
+        try:
+            return super().__call__(event, args)
+        finally:
+            self._time += time.perf_counter_ns() - start
+            self._events[event] = self._events.get(event, 0) + 1
+
+    def stats(self) -> dict[str, Any]:
+        wall_time = (time.perf_counter_ns() - self._start) / 1e9
+        hook_time = self._time / 1e9
+
+        return {
+            "wall_time": wall_time,
+            # Includes the time waiting for prompts and the broker
+            "hook_time": hook_time,
+            "hook_overhead": hook_time / wall_time if wall_time else 0.0,
+            "events": dict(
+                sorted(self._events.items(), key=lambda i: i[1], reverse=True)
+            ),
+            "handled": sum(j for i, j in self._events.items() if i in self._handlers),
+            "checks": dict(sorted(self._checks.items())),
+            "asked": self._asked,
+            "denied": self._denied,
+            "cache": self._permissions.cache_info()._asdict(),
+        }
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        cache = stats["cache"]
+
+        lines = [
+            "python_run stats",
+            f"  wall time      {stats['wall_time']:.3f}s",
+            f"  hook time      {stats['hook_time']:.3f}s"
+            f" ({stats['hook_overhead']:.2%})",
+            f"  events         {sum(stats['events'].values())}"
+            f" ({stats['handled']} handled)",
+            "  checks         "
+            + (", ".join(f"{i} {j}" for i, j in stats["checks"].items()) or "-"),
+            f"  asked          {stats['asked']} ({stats['denied']} denied)",
+            f"  verdict cache  {cache['hits']} hits, {cache['misses']} misses,"
+            f" {cache['currsize']}/{cache['maxsize']} entries",
+            "  events by type",
+        ]
+
+        for event, count in stats["events"].items():
+            lines.append(f"    {count:>11}  {event}")
+
+        return "\n".join(lines)
+
+    def report(self, file: IO[str] | None = None) -> None:
+        # `None` prints the table to stderr, otherwise JSON is written to
+        # the file, which was opened before the hook was installed
+        if file is None:
+            print(self.format_stats(), file=sys.stderr)
+        else:
+            json.dump(self.stats(), file)
+            file.close()
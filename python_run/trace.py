@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+import time
+from typing import IO, Any
+
+from .permission import Permission
+
+
+class Tracer:
+    def __init__(self, file: IO[str], name: str = "python_run") -> None:
+        # The file is opened by the caller before the hook is installed,
+        # so writing the trace doesn't go through the permission checks
+        self._file = file
+        self._name = name
+        self._pid = os.getpid()
+        self._start = time.perf_counter_ns()
+        self._records: list[tuple[str, int, int, int, Permission | None, str]] = []
+
+    def add(
+        self,
+        event: str,
+        start: int,
+        end: int,
+        permission: Permission | None,
+        verdict: str,
+    ) -> None:
+        self._records.append(
+            (event, threading.get_native_id(), start, end, permission, verdict)
+        )
+
+    def to_json(self) -> dict[str, Any]:
+        events: list[dict[str, Any]] = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": self._pid,
+                "args": {"name": self._name},
+            }
+        ]
+
+        for event, tid, start, end, permission, verdict in self._records:
+            args = {"verdict": verdict}
+
+            if permission is not None:
+                args["permission"] = permission.name.value
+                args["value"] = str(permission.value)
+
+            events.append(
+                {
+                    "name": event,
+                    "cat": "hook",
+                    "ph": "X",
+                    "ts": (start - self._start) / 1000,
+                    "dur": (end - start) / 1000,
+                    "pid": self._pid,
+                    "tid": tid,
+                    "args": args,
+                }
+            )
+
+        return {"traceEvents": events, "displayTimeUnit": "ns"}
+
+    def dump(self) -> None:
+        json.dump(self.to_json(), self._file)
+        self._file.close()
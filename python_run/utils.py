@@ -23,11 +23,11 @@ def parse_address(address: str) -> tuple[str, int | None]:
     port: str | int | None
 
     if address[0] == "[":
-        if address[-1] == "]":
-            host, port = address[1:-1], None
-        else:
-            host, port = address.rsplit(":", 1)
-            host = host[1:-1]
+        host, _, rest = address[1:].partition("]")
+        # Keeps the prefix length of CIDR blocks, e.g. `[fd00::]/8:443`
+        prefix, _, port = rest.partition(":")
+        host += prefix
+        port = port or None
     else:
         if ":" in address:
             host, port = address.rsplit(":", 1)
@@ -42,3 +42,42 @@ def parse_address(address: str) -> tuple[str, int | None]:
 
 def is_env_set(name: str) -> bool:
     return os.environ.get(name, "0").lower() in ["1", "true", "yes"]
+
+
+def get_cache_dir() -> str:
+    if cache_dir := os.environ.get("PYTHON_RUN_CACHE_DIR"):
+        return cache_dir
+
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+
+    return os.path.join(cache_home, "python_run")
+
+
+_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(value: str) -> int:
+    # `1048576`, `512K`, `512M`, `2G`, `2GB` or `2GiB`
+    number = value.strip().upper().removesuffix("B").removesuffix("I")
+    unit = number[-1:] if number[-1:].isalpha() else ""
+
+    try:
+        size = float(number.removesuffix(unit)) * _UNITS[unit]
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid size {value!r}") from None
+
+    if size < 0:
+        raise ValueError(f"Invalid size {value!r}")
+
+    return int(size)
+
+
+def format_size(size: float) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = "TiB"
+
+    return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
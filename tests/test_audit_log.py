@@ -0,0 +1,135 @@
+import io
+import json
+import multiprocessing
+import os
+import threading
+from unittest import mock
+
+import pytest
+
+from python_run.audit_log import AuditLog
+from python_run.hook import Hook
+from python_run.permission import Permission, PermissionAll, PermissionName, Permissions
+
+
+def read_records(file):
+    return [json.loads(i) for i in file.getvalue().splitlines()]
+
+
+@pytest.fixture
+def file():
+    file = io.StringIO()
+    file.close = mock.Mock()
+    return file
+
+
+def test_audit_log(file):
+    audit_log = AuditLog(file, interval=60)
+    audit_log.add(Permission(PermissionName.READ, "/tmp"), "allowed")
+    audit_log.add(Permission(PermissionName.NET, PermissionAll), "denied")
+
+    # Nothing is written by the hook's thread
+    assert file.getvalue() == ""
+
+    audit_log.close()
+
+    read, net = read_records(file)
+
+    assert read["permission"] == "read"
+    assert read["value"] == "/tmp"
+    assert read["decision"] == "allowed"
+    assert isinstance(read["ts"], float)
+    assert isinstance(read["pid"], int)
+
+    assert net["value"] is None
+    assert net["decision"] == "denied"
+
+    file.close.assert_called_once()
+
+
+def test_audit_log_background_writer(file):
+    written = threading.Event()
+    flush = file.flush
+
+    def flush_() -> None:
+        flush()
+        written.set()
+
+    file.flush = flush_
+
+    audit_log = AuditLog(file, interval=0.01)
+    audit_log.add(Permission(PermissionName.ENV, "HOME"), "granted")
+
+    assert written.wait(5)
+    assert read_records(file)[0]["decision"] == "granted"
+
+    audit_log.close()
+
+
+def test_audit_log_dropped(file):
+    audit_log = AuditLog(file, maxsize=2, interval=60)
+
+    for i in range(5):
+        audit_log.add(Permission(PermissionName.ENV, f"VAR{i}"), "allowed")
+
+    assert audit_log.dropped == 3
+
+    audit_log.close()
+
+    first, second, dropped = read_records(file)
+
+    assert first["value"] == "VAR0"
+    assert second["value"] == "VAR1"
+    assert dropped["dropped"] == 3
+
+
+def test_hook_audit_log(file):
+    audit_log = AuditLog(file, interval=60)
+
+    permissions = Permissions()
+    permissions.allow_read("/tmp")
+
+    hook = Hook("", permissions, audit_log=audit_log)
+    hook("open", ("/tmp/file", "r", None))
+
+    with mock.patch.object(hook, "_prompt", return_value=True):
+        hook("os.getenv", ("HOME",))
+
+    with mock.patch.object(hook, "_prompt", return_value=False):
+        with pytest.raises(SystemExit):
+            hook("os.getenv", ("PATH",))
+
+    audit_log.close()
+
+    assert [(i["value"], i["decision"]) for i in read_records(file)] == [
+        ("/tmp/file", "allowed"),
+        ("HOME", "granted"),
+        ("PATH", "denied"),
+    ]
+
+
+def _add_record(audit_log):
+    audit_log.add(Permission(PermissionName.READ, "/child"), "allowed")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_audit_log_fork(tmp_path):
+    path = tmp_path / "audit.jsonl"
+    audit_log = AuditLog(open(path, "a"), interval=60)
+
+    # Ends with `os._exit`, after the finalizers of multiprocessing
+    process = multiprocessing.get_context("fork").Process(
+        target=_add_record, args=(audit_log,)
+    )
+    process.start()
+    process.join()
+
+    audit_log.add(Permission(PermissionName.READ, "/parent"), "allowed")
+    audit_log.close()
+
+    records = [json.loads(i) for i in path.read_text().splitlines()]
+
+    assert {(i["value"], i["pid"]) for i in records} == {
+        ("/child", process.pid),
+        ("/parent", os.getpid()),
+    }
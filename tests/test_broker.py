@@ -0,0 +1,133 @@
+import os
+import stat
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from python_run.broker import Broker, BrokerClient
+from python_run.hook import Hook, HookExit
+from python_run.permission import Permission, PermissionName, Permissions
+
+
+@pytest.fixture
+def broker(tmp_path):
+    path = str(tmp_path / "broker.sock")
+    prompt = mock.Mock(return_value=True)
+
+    with Broker(path, prompt=prompt) as broker:
+        thread = threading.Thread(target=broker.serve_forever, args=(0.01,))
+        thread.start()
+
+        yield path, prompt, broker
+
+        broker.shutdown()
+        thread.join()
+
+
+def test_broker_grant(broker):
+    path, prompt, _ = broker
+
+    client = BrokerClient(path)
+    permission = Permission(PermissionName.READ, "/data/file")
+
+    assert client.request(permission)
+    assert client.request(permission)
+    assert BrokerClient(path).request(permission)
+
+    prompt.assert_called_once_with(permission)
+
+
+def test_broker_deny(broker):
+    path, prompt, _ = broker
+    prompt.return_value = False
+
+    permission = Permission(PermissionName.NET, "example.com:443")
+
+    assert not BrokerClient(path).request(permission)
+    assert not BrokerClient(path).request(permission)
+
+    prompt.assert_called_once_with(permission)
+
+
+def test_broker_deduplicate(broker):
+    path, prompt, _ = broker
+
+    def slow_prompt(permission):
+        time.sleep(0.2)
+        return True
+
+    prompt.side_effect = slow_prompt
+
+    permission = Permission(PermissionName.ENV, "HOME")
+    results = []
+
+    def request():
+        results.append(BrokerClient(path).request(permission))
+
+    threads = [threading.Thread(target=request) for _ in range(10)]
+
+    for i in threads:
+        i.start()
+    for i in threads:
+        i.join()
+
+    assert results == [True] * 10
+    prompt.assert_called_once_with(permission)
+
+
+def test_broker_permissions(tmp_path):
+    path = str(tmp_path / "broker.sock")
+    prompt = mock.Mock()
+
+    permissions = Permissions()
+    permissions.allow_read("/data")
+
+    with Broker(path, permissions, prompt=prompt) as broker:
+        assert broker.decide(Permission(PermissionName.READ, "/data/file"))
+
+    prompt.assert_not_called()
+
+
+def test_broker_socket_mode(tmp_path):
+    path = tmp_path / "broker.sock"
+    umask = os.umask(0)
+
+    try:
+        with Broker(str(path), prompt=mock.Mock()):
+            mode = stat.S_IMODE(path.stat().st_mode)
+            # Restored after `bind`
+            assert os.umask(0) == 0
+    finally:
+        os.umask(umask)
+
+    assert mode == 0o600
+
+
+def test_broker_client_closed(broker):
+    path, _, _ = broker
+
+    client = BrokerClient(path)
+    client.close()
+
+    assert not client.request(Permission(PermissionName.ENV, "HOME"))
+
+
+def test_hook_broker(broker):
+    path, prompt, _ = broker
+
+    permissions = Permissions()
+    hook = Hook("", permissions, broker=BrokerClient(path))
+
+    with mock.patch.object(hook, "_prompt") as hook_prompt:
+        assert hook("os.getenv", ("HOME",)) is HookExit.PERMISSION_GRANTED
+        assert hook("os.getenv", ("HOME",)) is HookExit.PERMISSION_OK
+
+        prompt.return_value = False
+
+        with pytest.raises(SystemExit):
+            hook("os.getenv", ("PATH",))
+
+    hook_prompt.assert_not_called()
+    assert prompt.call_count == 2
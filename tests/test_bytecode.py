@@ -0,0 +1,69 @@
+import os
+import sys
+from unittest import mock
+
+from python_run.bytecode import get_code, run_code
+
+
+def test_get_code(tmp_path):
+    file = tmp_path / "script.py"
+    file.write_text("x = 1\n")
+
+    cache_dir = tmp_path / "cache"
+
+    code = get_code(str(file), str(cache_dir))
+
+    assert code.co_filename == str(file)
+    assert len(os.listdir(cache_dir)) == 1
+
+    with mock.patch("builtins.compile") as compile_:
+        assert get_code(str(file), str(cache_dir)) == code
+
+    compile_.assert_not_called()
+
+
+def test_get_code_changed(tmp_path):
+    file = tmp_path / "script.py"
+    file.write_text("x = 1\n")
+
+    get_code(str(file), str(tmp_path / "cache"))
+
+    file.write_text("x = 2\n")
+
+    code = get_code(str(file), str(tmp_path / "cache"))
+
+    assert 2 in code.co_consts
+    assert len(os.listdir(tmp_path / "cache")) == 2
+
+
+def test_get_code_corrupted(tmp_path):
+    file = tmp_path / "script.py"
+    file.write_text("x = 1\n")
+
+    get_code(str(file), str(tmp_path / "cache"))
+
+    (cached,) = (tmp_path / "cache").iterdir()
+    cached.write_bytes(b"garbage")
+
+    assert 1 in get_code(str(file), str(tmp_path / "cache")).co_consts
+
+
+def test_run_code():
+    main_module = sys.modules["__main__"]
+    argv0 = sys.argv[0]
+
+    code = compile(
+        "import sys\n"
+        "sys.modules['__main__'].result = (__name__, __file__, sys.argv[0])\n"
+        "sys._test_run_code = sys.modules['__main__']",
+        "/script.py",
+        "exec",
+    )
+
+    run_code(code, "/script.py")
+
+    module = sys.__dict__.pop("_test_run_code")
+
+    assert module.result == ("__main__", "/script.py", "/script.py")
+    assert sys.modules["__main__"] is main_module
+    assert sys.argv[0] == argv0
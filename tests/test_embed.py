@@ -0,0 +1,211 @@
+import contextvars
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+from unittest import mock
+
+import pytest
+
+import python_run
+from python_run.hook import HookExit
+from python_run.permission import Permissions
+from python_run.embed import SandboxHook, _thread_start
+
+
+@pytest.fixture
+def hook():
+    # The real hook can't be removed, so `install` is only run in a subprocess
+    with mock.patch("python_run.embed.install"):
+        yield SandboxHook()
+
+
+def test_sandbox_hook(hook):
+    permissions = Permissions()
+    permissions.allow_read("/tmp")
+
+    assert hook("open", ("/etc/passwd", "r", None)) is None
+
+    with python_run.sandbox(permissions):
+        assert hook("open", ("/tmp/file", "r", None)) is HookExit.PERMISSION_OK
+
+        with pytest.raises(PermissionError, match="read access to '/etc/passwd'"):
+            hook("open", ("/etc/passwd", "r", None))
+
+    assert hook("open", ("/etc/passwd", "r", None)) is None
+
+
+def test_sandbox_nested(hook):
+    outer = Permissions()
+    outer.allow_read("/tmp")
+
+    inner = Permissions()
+    inner.allow_read("/")
+
+    # An inner sandbox can't allow more than the outer one
+    with python_run.sandbox(outer), python_run.sandbox(inner):
+        assert hook("open", ("/tmp/file", "r", None)) is HookExit.PERMISSION_OK
+
+        with pytest.raises(PermissionError):
+            hook("open", ("/etc/passwd", "r", None))
+
+
+def test_sandbox_other_context(hook):
+    outside = contextvars.copy_context()
+
+    def open_() -> HookExit | None:
+        return hook("open", ("/etc/passwd", "r", None))
+
+    with python_run.sandbox(Permissions()):
+        # The sandbox is still on the stack, whatever the context is
+        for context in (contextvars.Context(), outside.copy()):
+            with pytest.raises(PermissionError):
+                context.run(open_)
+
+    assert outside.run(open_) is None
+
+
+def test_sandbox_threads(hook):
+    with python_run.sandbox(Permissions()):
+        with pytest.raises(PermissionError):
+            hook("_thread.start_new_thread", (None, (), None))
+
+        with mock.patch.object(_thread_start, "active", True):
+            assert hook("_thread.start_new_thread", (None, (), None)) is None
+
+
+def test_sandbox_concurrent(hook):
+    results = {}
+    barrier = threading.Barrier(2)
+
+    def worker(path: str) -> None:
+        permissions = Permissions()
+        permissions.allow_read(path)
+
+        with python_run.sandbox(permissions):
+            barrier.wait()
+
+            try:
+                results[path] = hook("open", ("/a/file", "r", None))
+            except PermissionError:
+                results[path] = None
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in ("/a", "/b")]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {"/a": HookExit.PERMISSION_OK, "/b": None}
+
+
+SCRIPT = """
+import asyncio, contextvars, os, threading
+
+import python_run
+from python_run.permission import Permissions
+
+
+def read(path):
+    try:
+        with open(path):
+            return "ok"
+    except PermissionError:
+        return "denied"
+
+
+async def plugin(allowed, path):
+    permissions = Permissions()
+    permissions.allow_read(allowed)
+
+    with python_run.sandbox(permissions):
+        await asyncio.sleep(0.01)
+        return read(path)
+
+
+async def main():
+    return await asyncio.gather(
+        plugin(os.path.dirname(__file__), __file__),
+        plugin("/nonexistent", __file__),
+    )
+
+
+print(*asyncio.run(main()))
+
+with python_run.sandbox(Permissions()):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(read(__file__)))
+    thread.start()
+    thread.join()
+
+print(*results, read(__file__))
+
+
+async def executor():
+    loop = asyncio.get_running_loop()
+    # The threads of the default executor are started outside of the sandbox
+    results = [await loop.run_in_executor(None, read, __file__)]
+
+    with python_run.sandbox(Permissions()):
+        results.append(await loop.run_in_executor(None, read, __file__))
+
+    return results
+
+
+async def executor_started_in_sandbox():
+    loop = asyncio.get_running_loop()
+    results = []
+
+    with python_run.sandbox(Permissions()):
+        results.append(await loop.run_in_executor(None, read, __file__))
+
+    results.append(await loop.run_in_executor(None, read, __file__))
+    return results
+
+
+print(*asyncio.run(executor()))
+print(*asyncio.run(executor_started_in_sandbox()))
+
+
+async def other_task():
+    async def sandboxed():
+        with python_run.sandbox(Permissions()):
+            await asyncio.sleep(0.05)
+
+    # A suspended sandbox doesn't apply to the other tasks of the thread
+    task = asyncio.create_task(sandboxed())
+    await asyncio.sleep(0.01)
+    result = read(__file__)
+    await task
+
+    with python_run.sandbox(Permissions()):
+        escaped = contextvars.Context().run(read, __file__)
+
+    return result, escaped
+
+
+print(*asyncio.run(other_task()))
+"""
+
+
+def test_sandbox_installed(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text(textwrap.dedent(SCRIPT))
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    out = subprocess.check_output(
+        [sys.executable, str(script)],
+        env={**os.environ, "PYTHONPATH": root},
+        text=True,
+    )
+
+    assert out.splitlines() == [
+        "ok denied",
+        "denied ok",
+        "ok denied",
+        "denied ok",
+        "ok denied",
+    ]
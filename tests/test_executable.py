@@ -0,0 +1,97 @@
+import os
+from unittest import mock
+
+import pytest
+
+from python_run.executable import (
+    ExecutableCache,
+    executable_cache,
+    get_exec_path,
+    resolve_executable,
+)
+
+
+def make_executable(path) -> str:
+    path.write_text("#!/bin/sh\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.fixture
+def bin_dirs(tmp_path):
+    first, second = tmp_path / "first", tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+
+    executable_cache.clear()
+    yield first, second
+    executable_cache.clear()
+
+
+def test_get_exec_path():
+    assert get_exec_path({"PATH": "/a:/b"}) == ["/a", "/b"]
+    assert get_exec_path({}) == os.defpath.split(os.pathsep)
+
+    with mock.patch.dict(os.environ, {"PATH": "/c:/d"}):
+        assert get_exec_path() == ["/c", "/d"]
+        assert get_exec_path(os.environ) == ["/c", "/d"]
+
+
+def test_resolve_executable(bin_dirs):
+    first, second = bin_dirs
+
+    tool = make_executable(second / "tool")
+    (first / "tool").write_text("not executable")
+
+    env = {"PATH": f"{first}:{second}"}
+
+    assert resolve_executable("tool", env) == tool
+    assert resolve_executable(b"tool", env) == tool
+    assert resolve_executable("missing", env) == "missing"
+    assert resolve_executable("tool", env, cwd=second, search=False) == tool
+    assert resolve_executable(tool) == tool
+
+
+def test_resolve_executable_symlink(bin_dirs):
+    first, second = bin_dirs
+
+    tool = make_executable(second / "tool-1.0")
+    (first / "tool").symlink_to(tool)
+
+    assert resolve_executable("tool", {"PATH": str(first)}) == tool
+    assert resolve_executable(str(first / "tool")) == tool
+
+
+def test_executable_cache(bin_dirs):
+    first, second = bin_dirs
+
+    tool = make_executable(second / "tool")
+    dirs = (str(first), str(second))
+
+    cache = ExecutableCache()
+
+    with mock.patch.object(cache, "_search", wraps=cache._search) as search:
+        assert cache.which("tool", dirs) == tool
+        assert cache.which("tool", dirs) == tool
+        assert search.call_count == 1
+
+        # A new executable earlier in PATH changes the mtime of its directory
+        other = make_executable(first / "tool")
+        os.utime(first, ns=(0, 0))
+
+        assert cache.which("tool", dirs) == other
+        assert search.call_count == 2
+
+        assert cache.which("tool", dirs[1:]) == tool
+        assert search.call_count == 3
+
+
+def test_executable_cache_maxsize(bin_dirs):
+    first, _ = bin_dirs
+
+    cache = ExecutableCache(maxsize=2)
+
+    for i in range(3):
+        cache.which(f"tool{i}", (str(first),))
+
+    assert len(cache) == 2
@@ -1,12 +1,23 @@
 import io
 import os
 import re
+import shutil
+import subprocess
 import sys
+import threading
 from unittest import mock
 
 import pytest
 
-from python_run.hook import Hook, HookExit, add_os_getenv_audit
+from python_run.hook import (
+    Hook,
+    HookExit,
+    add_filtered_os_environ,
+    add_os_getenv_audit,
+    patch_os_open_dir_fd,
+    patch_os_posix_spawn,
+)
+from python_run.network import HostCache
 from python_run.permission import Permission, PermissionName, Permissions
 
 
@@ -26,6 +37,54 @@ def test_add_os_getenv_audit():
     mock_.assert_called_with("os.getenv", ("TEST",))
 
 
+@pytest.fixture
+def restore_environ():
+    classes = os.environ.__class__, os.environb.__class__
+
+    with mock.patch.dict(os.environ, {"TEST_A": "a", "TEST_B": "b"}):
+        yield
+
+        os.environ.__class__, os.environb.__class__ = classes
+
+
+def test_add_filtered_os_environ(restore_environ):
+    permissions = Permissions()
+    permissions.allow_env("TEST_A")
+
+    add_filtered_os_environ(permissions)
+
+    with mock.patch("sys.audit") as audit:
+        assert os.environ["TEST_A"] == "a"
+        assert os.environb[b"TEST_A"] == b"a"
+
+        assert audit.call_count == 0
+
+        assert os.environ.get("TEST_B") == "b"
+        assert os.environ.get("TEST_B") == "b"
+
+        audit.assert_called_once_with("os.getenv", "TEST_B")
+
+        os.environ["TEST_A"] = "c"
+        assert os.environ["TEST_A"] == "c"
+        assert os.environb[b"TEST_A"] == b"c"
+
+        del os.environ["TEST_A"]
+        assert os.environ.get("TEST_A") is None
+
+
+def test_add_filtered_os_environ_pattern(restore_environ):
+    permissions = Permissions()
+    permissions.allow_env("TEST_*")
+
+    add_filtered_os_environ(permissions)
+
+    with mock.patch("sys.audit") as audit:
+        assert os.environ["TEST_A"] == "a"
+        assert os.environ["TEST_B"] == "b"
+
+        assert audit.call_count == 0
+
+
 def test_hook_input():
     hook = Hook("", Permissions())
 
@@ -53,6 +112,120 @@ def test_hook_open():
     hook("open", ("/tmp/file", "w", None)) is HookExit.PERMISSION_OK
 
 
+def test_hook_open_flags(tmp_path):
+    tmp_path = tmp_path.resolve()
+
+    permissions = Permissions()
+    permissions.allow_read(str(tmp_path / "read"))
+    permissions.allow_write(str(tmp_path / "write"))
+
+    hook = Hook("", permissions)
+
+    read, write = str(tmp_path / "read" / "file"), str(tmp_path / "write" / "file")
+
+    assert hook("open", (read, None, os.O_RDONLY)) is HookExit.PERMISSION_OK
+    assert hook("open", (write, None, os.O_WRONLY)) is HookExit.PERMISSION_OK
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL
+    assert hook("open", (write, "x", flags)) is HookExit.PERMISSION_OK
+
+    with mock.patch.object(hook, "_prompt", return_value=False):
+        # Reading and writing requires both permissions
+        with pytest.raises(SystemExit, match="read access"):
+            hook("open", (write, "r+", os.O_RDWR))
+
+        with pytest.raises(SystemExit, match="write access"):
+            hook("open", (read, None, os.O_RDONLY | os.O_CREAT))
+
+
+def test_hook_open_symlink(tmp_path):
+    tmp_path = tmp_path.resolve()
+
+    (tmp_path / "allowed").mkdir()
+    (tmp_path / "secret").mkdir()
+    (tmp_path / "allowed" / "link").symlink_to(tmp_path / "secret")
+
+    permissions = Permissions()
+    permissions.allow_read(str(tmp_path / "allowed"))
+
+    hook = Hook("", permissions)
+
+    with mock.patch.object(hook, "_prompt", return_value=False):
+        with pytest.raises(SystemExit, match="secret"):
+            hook("open", (str(tmp_path / "allowed" / "link" / "file"), "r", 0))
+
+
+def test_hook_open_symlink_changed(tmp_path):
+    tmp_path = tmp_path.resolve()
+
+    (tmp_path / "allowed").mkdir()
+    (tmp_path / "allowed" / "dir").mkdir()
+    (tmp_path / "secret").mkdir()
+
+    permissions = Permissions()
+    permissions.allow_read(str(tmp_path / "allowed"))
+
+    hook = Hook("", permissions)
+
+    path = str(tmp_path / "allowed" / "dir" / "file")
+
+    assert hook("open", (path, "r", 0)) is HookExit.PERMISSION_OK
+
+    (tmp_path / "allowed" / "dir").rmdir()
+    hook("os.rmdir", (str(tmp_path / "allowed" / "dir"), -1))
+    (tmp_path / "allowed" / "dir").symlink_to(tmp_path / "secret")
+    hook("os.symlink", (str(tmp_path / "secret"), "dir", -1))
+
+    with mock.patch.object(hook, "_prompt", return_value=False):
+        with pytest.raises(SystemExit, match="secret"):
+            hook("open", (path, "r", 0))
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="requires procfs")
+def test_hook_open_dir_fd(tmp_path):
+    tmp_path = tmp_path.resolve()
+
+    permissions = Permissions()
+    permissions.allow_read(str(tmp_path))
+
+    hook = Hook("", permissions)
+
+    def open_(path, flags, mode=0o777, *, dir_fd=None):
+        return hook("open", (path, None, flags))
+
+    fd = os.open(tmp_path, os.O_RDONLY)
+
+    try:
+        with mock.patch("os.open", open_):
+            patch_os_open_dir_fd()
+
+            assert os.open("file", os.O_RDONLY, dir_fd=fd) is HookExit.PERMISSION_OK
+    finally:
+        os.close(fd)
+
+
+def test_hook_open_dir_fd_forged(tmp_path, monkeypatch):
+    allowed = tmp_path / "allowed"
+    allowed.mkdir()
+    monkeypatch.chdir(tmp_path)
+
+    permissions = Permissions()
+    permissions.allow_read(str(allowed.resolve()))
+
+    hook = Hook("", permissions)
+
+    fd = os.open(allowed, os.O_RDONLY)
+
+    try:
+        # The script can raise any event, it mustn't redirect the next `open`
+        assert hook("__os_open_dir_fd", ("secret", fd)) is None
+
+        with mock.patch.object(hook, "_prompt", return_value=False):
+            with pytest.raises(SystemExit, match="Requires read access"):
+                hook("open", ("secret", None, os.O_RDONLY))
+    finally:
+        os.close(fd)
+
+
 def test_hook_open_current_file():
     permissions = Permissions()
 
@@ -69,6 +242,7 @@ def test_hook_os_env():
     hook("os.putenv", ("TEST", "value")) is HookExit.PERMISSION_OK
     hook("os.unsetenv", ("TEST",)) is HookExit.PERMISSION_OK
     hook("os.getenv", ("TEST",)) is HookExit.PERMISSION_OK
+    assert hook("os.getenv", (b"TEST",)) is HookExit.PERMISSION_OK
 
 
 def test_hook_os_exec():
@@ -78,6 +252,107 @@ def test_hook_os_exec():
 
     hook = Hook("", permissions)
     hook("os.exec", ("/bin/ls", ".")) is HookExit.PERMISSION_OK
+    assert hook("os.exec", ("/bin/ls", ["ls"], {})) is HookExit.PERMISSION_OK
+    assert hook("os.posix_spawn", ("/bin/ls", ["ls"], {})) is HookExit.PERMISSION_OK
+
+
+def test_hook_os_posix_spawn(tmp_path, monkeypatch):
+    # A decoy in the current directory, `posix_spawnp` runs the one in PATH
+    decoy = tmp_path / "ls"
+    decoy.write_text("#!/bin/sh\n")
+    decoy.chmod(0o755)
+    monkeypatch.chdir(tmp_path)
+
+    permissions = Permissions()
+    permissions.allow_run(str(decoy))
+
+    hook = Hook("", permissions)
+
+    with mock.patch.object(hook, "_prompt", return_value=False):
+        with pytest.raises(SystemExit, match="Requires run access"):
+            hook("os.posix_spawn", ("ls", ["ls"], {}))
+
+    assert hook("os.posix_spawn", ("./ls", ["ls"], {})) is HookExit.PERMISSION_OK
+
+
+def test_patch_os_posix_spawn():
+    spawn = mock.Mock()
+
+    with mock.patch("os.posix_spawn", spawn):
+        patch_os_posix_spawn()
+
+        os.posix_spawn("ls", ["ls"], {})
+        os.posix_spawn(b"ls", [b"ls"], {})
+        os.posix_spawn("/bin/ls", ["ls"], {})
+
+    assert [i.args[0] for i in spawn.call_args_list] == ["./ls", b"./ls", "/bin/ls"]
+
+
+def test_hook_os_execvp(tmp_path):
+    # `os.execvp` tries every directory in PATH, the first ones don't have it
+    script = tmp_path / "script.py"
+    script.write_text('import os\nos.execvp("true", ["true"])\n')
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    true = shutil.which("true")
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "python_run",
+            str(script),
+            "--allow-run=true",
+            "--allow-env=PATH",
+        ],
+        cwd=root,
+        env={
+            **os.environ,
+            "PYTHON_NO_PROMPT": "1",
+            "PATH": os.pathsep.join(
+                [str(tmp_path / "missing"), str(tmp_path), os.path.dirname(true)]
+            ),
+        },
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+
+
+def test_hook_subprocess_popen(tmp_path):
+    tool = tmp_path / "tool"
+    tool.write_text("#!/bin/sh\n")
+    tool.chmod(0o755)
+
+    env = {"PATH": str(tmp_path)}
+
+    with mock.patch.dict(os.environ, env):
+        permissions = Permissions()
+        permissions.allow_run("tool")
+
+    hook = Hook("", permissions)
+
+    assert (
+        hook("subprocess.Popen", ("tool", ["tool"], None, env))
+        is HookExit.PERMISSION_OK
+    )
+    assert (
+        hook("subprocess.Popen", (None, ["./tool"], str(tmp_path), None))
+        is HookExit.PERMISSION_OK
+    )
+
+    # Another `tool` earlier in the PATH of the child is not allowed
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "tool").write_bytes(tool.read_bytes())
+    (other / "tool").chmod(0o755)
+
+    env = {"PATH": f"{other}:{tmp_path}"}
+
+    with mock.patch.object(hook, "_prompt", return_value=False):
+        with pytest.raises(SystemExit):
+            hook("subprocess.Popen", ("tool", ["tool"], None, env))
 
 
 def test_hook_socket_connect():
@@ -154,3 +429,124 @@ def test_hook_prompt_unrecognized_option(capsys):
     assert (
         len(re.findall(r"Allow\? \[y/n\] \(y = yes, allow; n = no, deny\) >", out)) == 2
     )
+
+
+@pytest.mark.parametrize(
+    "event", ["exec", "compile", "marshal.loads", "sys._getframe", "object.__getattr__"]
+)
+def test_hook_unhandled_event(event):
+    hook = Hook("", Permissions())
+
+    assert hook(event, (None,)) is None
+
+
+def test_hook_prompt_hostnames(capsys):
+    sys.stdin = io.StringIO("y")
+
+    cache = HostCache()
+    cache.add("151.101.1.69", "pypi.org")
+    cache.add("151.101.1.69", "files.pythonhosted.org")
+
+    with mock.patch("python_run.hook.ip2host_cache", cache):
+        Hook._prompt(Permission(PermissionName.NET, "151.101.1.69:443"))
+
+    out, _ = capsys.readouterr()
+
+    assert "'151.101.1.69:443 (files.pythonhosted.org, pypi.org)'" in out
+
+
+def test_hook_import_other_thread():
+    hook = Hook("", Permissions())
+
+    thread = threading.Thread(target=hook, args=("import", ("os",)))
+    thread.start()
+    thread.join()
+
+    with mock.patch.object(hook, "_prompt", return_value=True):
+        assert hook("open", ("/tmp/file", "r", None)) is HookExit.PERMISSION_GRANTED
+
+
+def test_hook_open_private_dir():
+    hook = Hook("", Permissions(), private_dirs=["/cache/python_run"])
+
+    # Only importlib's own bytecode writes don't require a permission
+    with mock.patch.object(hook, "_prompt", return_value=False):
+        for path in [
+            "/cache/python_run/a.pyc",
+            "/cache/python_run/../../secret.txt",
+            "/cache/python_run_other",
+        ]:
+            with pytest.raises(SystemExit):
+                hook("open", (path, "r", None))
+
+        with pytest.raises(SystemExit, match="'/cache/python_run/scripts/a.pyc'"):
+            hook("os.rename", ("/tmp/a.pyc", "/cache/python_run/scripts/a.pyc", -1, -1))
+
+        with pytest.raises(SystemExit, match="'/cache/python_run/scripts/a.pyc'"):
+            hook("os.symlink", ("/tmp/a.pyc", "/cache/python_run/scripts/a.pyc", -1))
+
+    assert hook("os.rename", ("/tmp/a", "/tmp/b", -1, -1)) is None
+
+
+PRIVATE_DIR_SCRIPT = """
+import importlib
+import os
+import sys
+
+sys.path.insert(0, {modules!r})
+importlib.import_module("mymodule")
+
+for path in [{secret!r}, {script_pyc!r}]:
+    try:
+        open(path, "w").close()
+        print("written")
+    except SystemExit:
+        print("denied")
+"""
+
+
+def test_hook_open_private_dir_bytecode(tmp_path):
+    cache_dir = tmp_path / "cache"
+    modules = tmp_path / "modules"
+    modules.mkdir()
+    (modules / "mymodule.py").write_text("")
+
+    bytecode_dir = cache_dir / "bytecode"
+    script = tmp_path / "script.py"
+    script.write_text(
+        PRIVATE_DIR_SCRIPT.format(
+            modules=str(modules),
+            secret=str(bytecode_dir / ".." / ".." / "secret.txt"),
+            script_pyc=str(bytecode_dir / "scripts" / "forged.pyc"),
+        )
+    )
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    out = subprocess.check_output(
+        [
+            sys.executable,
+            "-m",
+            "python_run",
+            str(script),
+            "--cache-bytecode",
+            f"--allow-read={modules}",
+        ],
+        cwd=root,
+        env={
+            **os.environ,
+            "PYTHON_NO_PROMPT": "1",
+            "PYTHON_RUN_CACHE_DIR": str(cache_dir),
+        },
+        text=True,
+    )
+
+    assert out.split() == ["denied", "denied"]
+    assert not (tmp_path / "secret.txt").exists()
+    assert list((bytecode_dir / "modules").rglob("mymodule.*.pyc"))
+
+
+def test_hook_open_fd():
+    hook = Hook("", Permissions())
+
+    assert hook("open", (3, "wb", None)) is None
@@ -0,0 +1,119 @@
+import io
+import json
+import tomllib
+from unittest import mock
+
+from python_run.hook import HookExit
+from python_run.learn import LearnHook, coalesce_hosts, coalesce_paths
+from python_run.network import HostCache
+from python_run.permission import Permissions
+from python_run.policy import parse_policy
+
+
+def test_coalesce_paths():
+    paths = [f"/home/user/project/src/{i}.py" for i in range(3)] + [
+        "/home/user/project/README.md",
+        "/etc/hosts",
+        "/etc/resolv.conf",
+    ]
+
+    assert coalesce_paths(paths, 3) == [
+        "/etc/hosts",
+        "/etc/resolv.conf",
+        "/home/user/project/README.md",
+        "/home/user/project/src",
+    ]
+    assert coalesce_paths(paths, 2) == [
+        "/etc/hosts",
+        "/etc/resolv.conf",
+        "/home/user/project",
+    ]
+    assert coalesce_paths(paths, 0) == sorted(paths)
+
+
+def test_coalesce_paths_directory():
+    # A recorded directory covers the files under it
+    assert coalesce_paths(["/data/a", "/data/a/b", "/data/c"], 8) == [
+        "/data/a",
+        "/data/c",
+    ]
+
+
+def test_coalesce_hosts():
+    hosts = [
+        "a.cdn.example.com:443",
+        "b.cdn.example.com:443",
+        "c.cdn.example.com:80",
+        "api.github.com:443",
+        "10.0.0.1:5432",
+        "example.org",
+    ]
+
+    assert coalesce_hosts(hosts, 3) == [
+        "10.0.0.1:5432",
+        "api.github.com:443",
+        "cdn.example.com:443",
+        "cdn.example.com:80",
+        "example.org",
+    ]
+    assert coalesce_hosts(hosts, 0) == sorted(hosts)
+
+
+def test_coalesce_hosts_top_level():
+    assert coalesce_hosts(["a.com", "b.com", "c.com"], 2) == ["a.com", "b.com", "c.com"]
+
+
+def make_hook() -> LearnHook:
+    hook = LearnHook("", Permissions())
+
+    for i in range(3):
+        assert hook("open", (f"/srv/app/data/{i}.csv", "r", None)) == (
+            HookExit.PERMISSION_OK
+        )
+
+    hook("open", ("/srv/app/out[1].txt", "w", None))
+    hook("os.getenv", ("HOME",))
+    hook("os.getenv", ("HOME",))
+
+    cache = HostCache()
+    cache.add("93.184.216.34", "example.com")
+
+    with mock.patch("python_run.learn.ip2host_cache", cache):
+        hook("socket.connect", (None, ("93.184.216.34", 443)))
+        hook("socket.connect", (None, ("10.0.0.1", 5432)))
+
+    return hook
+
+
+def test_learn_hook():
+    assert make_hook().policy(3) == {
+        "allow": {
+            "env": ["HOME"],
+            "net": ["10.0.0.1:5432", "example.com:443"],
+            "read": ["/srv/app/data"],
+            "write": ["/srv/app/out[[]1].txt"],
+        }
+    }
+
+
+def test_learn_hook_report():
+    file = io.StringIO()
+    file.close = mock.Mock()
+
+    hook = make_hook()
+    hook.report(file, 3)
+
+    data = tomllib.loads(file.getvalue())
+    assert data == hook.policy(3)
+
+    permissions = parse_policy(data)
+    assert permissions.check_read("/srv/app/data/4.csv")
+    assert permissions.check_write("/srv/app/out[1].txt")
+    assert not permissions.check_write("/srv/app/out1.txt")
+
+
+def test_learn_hook_report_json(tmp_path):
+    hook = make_hook()
+    hook.report(open(tmp_path / "policy.json", "w"))
+
+    assert json.loads((tmp_path / "policy.json").read_text()) == hook.policy()
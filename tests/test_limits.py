@@ -0,0 +1,152 @@
+import io
+import os
+import resource
+import subprocess
+import sys
+from unittest import mock
+
+import pytest
+
+from python_run.limits import ResourceLimits, _set_limit
+
+
+def test_set_limit():
+    with mock.patch("resource.getrlimit", return_value=(100, 200)), mock.patch(
+        "resource.setrlimit"
+    ) as setrlimit:
+        _set_limit(resource.RLIMIT_NOFILE, 50)
+        setrlimit.assert_called_with(resource.RLIMIT_NOFILE, (50, 50))
+
+        # The hard limit can't be raised
+        _set_limit(resource.RLIMIT_CPU, 300, 301)
+        setrlimit.assert_called_with(resource.RLIMIT_CPU, (200, 200))
+
+
+def test_resource_limits_apply():
+    limits = ResourceLimits(
+        memory=2**30, cpu_time=10, open_files=64, file_size=2**20
+    )
+
+    with mock.patch("python_run.limits._set_limit") as set_limit, mock.patch(
+        "signal.signal"
+    ):
+        limits.apply()
+
+    assert set_limit.call_args_list == [
+        mock.call(resource.RLIMIT_AS, 2**30),
+        mock.call(resource.RLIMIT_CPU, 10, 11),
+        mock.call(resource.RLIMIT_NOFILE, 64),
+        mock.call(resource.RLIMIT_FSIZE, 2**20),
+    ]
+
+    limits.report(io.StringIO())
+
+
+def test_resource_limits_cpu_time():
+    limits = ResourceLimits(cpu_time=10)
+
+    with pytest.raises(SystemExit, match="CPU time limit of 10 seconds"):
+        limits._on_cpu_time(0, None)
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/io"), reason="requires procfs")
+def test_resource_limits_report(tmp_path):
+    limits = ResourceLimits(open_files=4096, file_size=2**20, write_bytes=2**30)
+
+    with mock.patch("python_run.limits._set_limit"):
+        limits.apply()
+
+    (tmp_path / "file").write_bytes(b"x" * 2048)
+
+    usage = limits.usage()
+
+    assert usage["cpu_time"] > 0
+    assert usage["memory"] > 0
+    assert usage["open_files"] > 0
+    assert usage["write_bytes"] >= 2048
+
+    out = io.StringIO()
+    limits.report(out)
+
+    summary = out.getvalue()
+
+    assert summary.startswith("python_run usage: cpu time ")
+    assert "open files at exit" in summary
+    assert "/ 4096" in summary
+    assert "/ 1.0 GiB" in summary
+    assert "max file size 1.0 MiB" in summary
+
+
+def test_resource_limits_file_size(tmp_path):
+    # Runs in a subprocess, the limit can't be lowered back
+    code = (
+        "from python_run.limits import ResourceLimits\n"
+        "ResourceLimits(file_size=1024).apply()\n"
+        f"with open({str(tmp_path / 'file')!r}, 'wb') as fp:\n"
+        "    fp.write(b'x' * 4096)\n"
+    )
+
+    process = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True
+    )
+
+    assert process.returncode == 1
+    assert "File too large" in process.stderr
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/io"), reason="requires procfs")
+def test_resource_limits_write_bytes(tmp_path):
+    # Spread over many files, each one is small
+    code = (
+        "import time\n"
+        "from python_run.limits import ResourceLimits\n"
+        "ResourceLimits(write_bytes=64 * 1024).apply()\n"
+        "for i in range(1000):\n"
+        f"    with open({str(tmp_path)!r} + f'/{{i}}', 'wb') as fp:\n"
+        "        fp.write(b'x' * 4096)\n"
+        "    time.sleep(0.001)\n"
+        "print('done')\n"
+    )
+
+    process = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True
+    )
+
+    assert process.returncode == 1
+    assert "Exceeded the write limit of 64.0 KiB" in process.stderr
+    assert "done" not in process.stdout
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/io"), reason="requires procfs")
+def test_resource_limits_write_bytes_caught(tmp_path):
+    code = (
+        "import time\n"
+        "from python_run.limits import ResourceLimits\n"
+        "ResourceLimits(write_bytes=64 * 1024, grace=0.2).apply()\n"
+        "start = time.monotonic()\n"
+        "while time.monotonic() - start < 5:\n"
+        "    try:\n"
+        f"        with open({str(tmp_path)!r} + '/file', 'wb') as fp:\n"
+        "            fp.write(b'x' * 4096)\n"
+        "        time.sleep(0.001)\n"
+        "    except SystemExit:\n"
+        "        pass\n"
+        "print('done')\n"
+    )
+
+    process = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, timeout=10
+    )
+
+    assert process.returncode == 1
+    assert "Exceeded the write limit of 64.0 KiB" in process.stderr
+    assert "done" not in process.stdout
+
+
+def test_resource_limits_write_bytes_unsupported():
+    limits = ResourceLimits(write_bytes=1024)
+
+    with mock.patch("os.open", side_effect=OSError), pytest.raises(
+        ValueError, match="/proc/self/io"
+    ):
+        limits.apply()
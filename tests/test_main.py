@@ -1,9 +1,19 @@
+import json
 import sys
 from unittest import mock
 
+import pytest
+
 from python_run.__main__ import main
 
 
+@pytest.fixture(autouse=True)
+def addaudithook():
+    # Audit hooks can't be removed, so they must not leak into other tests
+    with mock.patch("sys.addaudithook") as addaudithook:
+        yield addaudithook
+
+
 def test_main():
     sys.argv = [
         "python-run",
@@ -28,3 +38,176 @@ def test_main_allow_all():
         "python_run.hook.Hook._is_protected_os_env_attr", return_value=False
     ):
         main()
+
+
+def test_main_resolve_hosts():
+    sys.argv = ["python-run", "myfile.py", "--allow-net", "a.com,10.0.0.1"]
+
+    with mock.patch("runpy.run_path"), mock.patch(
+        "python_run.hook.Hook._is_protected_os_env_attr", return_value=False
+    ), mock.patch("python_run.__main__.resolve_hosts") as resolve_hosts:
+        main()
+
+    resolve_hosts.assert_called_once_with(["a.com"], 2.0)
+
+    sys.argv += ["--resolve-timeout", "0"]
+
+    with mock.patch("runpy.run_path"), mock.patch(
+        "python_run.hook.Hook._is_protected_os_env_attr", return_value=False
+    ), mock.patch("python_run.__main__.resolve_hosts") as resolve_hosts:
+        main()
+
+    resolve_hosts.assert_not_called()
+
+
+def test_main_audit_log(tmp_path):
+    audit_log = tmp_path / "audit.jsonl"
+
+    sys.argv = ["python-run", "myfile.py", "--allow-all", "--audit-log", str(audit_log)]
+
+    with mock.patch("runpy.run_path"), mock.patch(
+        "python_run.hook.Hook._is_protected_os_env_attr", return_value=False
+    ), mock.patch("atexit.register") as register:
+        main()
+
+    (close,) = register.call_args.args
+    close()
+
+    assert audit_log.exists()
+
+
+def test_main_stats(tmp_path):
+    stats = tmp_path / "stats.json"
+
+    sys.argv = ["python-run", "myfile.py", "--allow-all", "--stats-file", str(stats)]
+
+    with mock.patch("runpy.run_path"), mock.patch(
+        "python_run.hook.Hook._is_protected_os_env_attr", return_value=False
+    ), mock.patch("atexit.register") as register:
+        main()
+
+    report, file = register.call_args.args
+    report(file)
+
+    assert "events" in json.loads(stats.read_text())
+
+
+def test_main_stats_flag(tmp_path):
+    script = tmp_path / "job.py"
+    script.write_text("")
+
+    sys.argv = ["python-run", "--allow-all", "--stats", str(script), "arg"]
+
+    with mock.patch("runpy.run_path") as run_path, mock.patch(
+        "python_run.hook.Hook._is_protected_os_env_attr", return_value=False
+    ), mock.patch("atexit.register") as register:
+        main()
+
+    assert run_path.call_args.args[0] == str(script)
+    assert register.call_args.args[1] is None
+    assert script.read_text() == ""
+
+
+def test_main_learn(tmp_path):
+    policy = tmp_path / "policy.json"
+
+    sys.argv = ["python-run", "myfile.py", "--learn", str(policy)]
+
+    with mock.patch("runpy.run_path"), mock.patch(
+        "python_run.hook.Hook._is_protected_os_env_attr", return_value=False
+    ), mock.patch("atexit.register") as register:
+        main()
+
+    report, file, threshold = register.call_args.args
+    report(file, threshold)
+
+    assert json.loads(policy.read_text()) == {"allow": {}}
+
+
+def test_main_trace(tmp_path):
+    trace = tmp_path / "trace.json"
+
+    sys.argv = ["python-run", "myfile.py", "--allow-all", "--trace", str(trace)]
+
+    with mock.patch("runpy.run_path"), mock.patch(
+        "python_run.hook.Hook._is_protected_os_env_attr", return_value=False
+    ), mock.patch("atexit.register") as register:
+        main()
+
+    (dump,) = register.call_args.args
+    dump()
+
+    assert "traceEvents" in json.loads(trace.read_text())
+
+
+def test_main_remote_file(tmp_path):
+    sys.argv = ["python-run", "https://example.com/job.py", "--offline", "arg"]
+
+    with mock.patch("runpy.run_path") as run_path, mock.patch(
+        "python_run.__main__.fetch_remote_file", return_value=str(tmp_path / "a.py")
+    ) as fetch_remote_file, mock.patch(
+        "python_run.__main__.get_cache_dir", return_value=str(tmp_path)
+    ), mock.patch(
+        "python_run.hook.Hook._is_protected_os_env_attr", return_value=False
+    ):
+        main()
+
+    fetch_remote_file.assert_called_once_with(
+        "https://example.com/job.py", str(tmp_path), reload=False, offline=True
+    )
+    run_path.assert_called_once_with(str(tmp_path / "a.py"), run_name="__main__")
+    assert sys.argv[1:] == [str(tmp_path / "a.py"), "arg"]
+
+
+def test_main_remote_file_error(tmp_path):
+    sys.argv = ["python-run", "https://example.com/job.py", "--offline"]
+
+    with mock.patch.dict("os.environ", {"PYTHON_RUN_CACHE_DIR": str(tmp_path)}):
+        with pytest.raises(SystemExit, match="is not in the cache"):
+            main()
+
+
+def test_main_cache_bytecode(tmp_path):
+    file = tmp_path / "myfile.py"
+    file.write_text("")
+
+    sys.argv = ["python-run", str(file), "--allow-all", "--cache-bytecode"]
+
+    with mock.patch("python_run.bytecode.run_code") as run_code, mock.patch(
+        "python_run.hook.Hook._is_protected_os_env_attr", return_value=False
+    ), mock.patch.dict("os.environ", {"PYTHON_RUN_CACHE_DIR": str(tmp_path)}):
+        with mock.patch.object(sys, "pycache_prefix"), mock.patch.object(
+            sys, "dont_write_bytecode"
+        ):
+            main()
+
+            assert sys.pycache_prefix == str(tmp_path / "bytecode" / "modules")
+
+    code, file_ = run_code.call_args.args
+
+    assert code.co_filename == file_ == str(file)
+
+
+def test_main_policy(tmp_path):
+    policy = tmp_path / "policy.json"
+    policy.write_text('{"allow": {"read": ["/data"]}}')
+
+    sys.argv = ["python-run", "myfile.py", "--policy", str(policy), "--allow-env"]
+
+    with mock.patch("runpy.run_path"), mock.patch(
+        "python_run.hook.Hook._is_protected_os_env_attr", return_value=False
+    ), mock.patch("python_run.__main__.Hook") as hook:
+        main()
+
+    _, permissions, *_ = hook.call_args.args
+
+    assert permissions.check_read("/data/file")
+    assert permissions.check_env("HOME")
+    assert not permissions.check_read("/etc/passwd")
+
+
+def test_main_broker_error(tmp_path):
+    sys.argv = ["python-run", "myfile.py", "--broker", str(tmp_path / "missing.sock")]
+
+    with pytest.raises(SystemExit, match="Cannot connect to the broker"):
+        main()
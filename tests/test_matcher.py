@@ -0,0 +1,201 @@
+import pytest
+
+from python_run.matcher import (
+    DomainTrie,
+    IPRangeSet,
+    PathTrie,
+    PatternSet,
+    escape_pattern,
+    is_pattern,
+    split_path,
+    translate_pattern,
+)
+
+
+def test_split_path():
+    assert split_path("/tmp//foo/bar/") == ["tmp", "foo", "bar"]
+    assert split_path("/") == []
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/tmp", True),
+        ("/tmp/file", True),
+        ("/tmp/dir/file", True),
+        ("/tmpfoo", False),
+        ("/tmpfoo/file", False),
+        ("/etc/passwd", True),
+        ("/etc/passwd.bak", False),
+        ("/etc/shadow", False),
+        ("/", False),
+    ],
+)
+def test_path_trie(path, expected):
+    trie = PathTrie()
+    trie.add("/tmp")
+    trie.add("/etc/passwd")
+
+    assert trie.match(path) == expected
+
+
+def test_path_trie_root():
+    trie = PathTrie()
+    trie.add("/")
+
+    assert trie.match("/")
+    assert trie.match("/etc/passwd")
+
+
+def test_path_trie_empty():
+    assert not PathTrie().match("/tmp")
+
+
+@pytest.mark.parametrize(
+    "ip, port, expected",
+    [
+        ("10.1.2.3", 80, True),
+        ("10.255.255.255", None, True),
+        ("11.0.0.0", 80, False),
+        ("192.168.1.1", 443, True),
+        ("192.168.1.1", 80, False),
+        ("192.168.2.1", 443, False),
+        ("fd12::1", 22, True),
+        ("fe80::1", 22, False),
+        ("::ffff:10.0.0.1", 22, False),
+        ("not-an-ip", 22, False),
+    ],
+)
+def test_ip_range_set(ip, port, expected):
+    ranges = IPRangeSet()
+    ranges.add("10.0.0.0/8")
+    ranges.add("192.168.1.0/24", 443)
+    ranges.add("fd00::/8")
+
+    assert ranges.match(ip, port) == expected
+
+
+def test_ip_range_set_merge():
+    ranges = IPRangeSet()
+
+    for i in range(256):
+        ranges.add(f"10.0.{i}.0/24")
+
+    ranges.add("10.0.0.7")
+
+    assert ranges.match("10.0.128.1")
+    assert not ranges.match("10.1.0.0")
+
+    ranges.add("10.1.0.0/16")
+
+    assert ranges.match("10.1.0.0")
+
+
+@pytest.mark.parametrize(
+    "host, port, expected",
+    [
+        ("google.com", 80, True),
+        ("www.google.com", 443, True),
+        ("WWW.Google.com.", 443, True),
+        ("evilgoogle.com", 443, False),
+        ("com", 443, False),
+        ("api.example.org", 443, True),
+        ("api.example.org", 80, False),
+        ("example.org", 443, False),
+    ],
+)
+def test_domain_trie(host, port, expected):
+    trie = DomainTrie()
+    trie.add("google.com")
+    trie.add("api.example.org", 443)
+
+    assert trie.match(host, port) == expected
+
+
+@pytest.mark.parametrize(
+    "pattern, sep, expected",
+    [
+        ("/data/*/cache", "/", "/data/[^/]*/cache"),
+        ("/data/**", "/", "/data/.*"),
+        ("/data/**/cache", "/", "/data/(?:.*/)?cache"),
+        ("file?.txt", "/", r"file[^/]\.txt"),
+        ("[!a-c]x", "/", "[^a-c]x"),
+        ("[[]x", "/", r"[\[]x"),
+        ("[x", "/", r"\[x"),
+        ("[", "/", r"\["),
+        ("[!]", "/", r"\[!\]"),
+        ("[]]x", "/", "[]]x"),
+        ("[!]a]", "/", "[^]a]"),
+        ("AWS_*", None, "AWS_.*"),
+    ],
+)
+def test_translate_pattern(pattern, sep, expected):
+    assert translate_pattern(pattern, sep) == expected
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/data/a/cache/file", True),
+        ("/data/a/cache/dir/file", True),
+        ("/data/a/b/cache/file", False),
+        ("/data/a/cache", False),
+        ("/home/user/table.parquet", True),
+        ("/table.parquet", True),
+        ("/home/user/table.parquet/part-0", True),
+        ("/home/user/table.parquet.bak", False),
+        ("/srv/log1.txt", True),
+        ("/srv/log12.txt", False),
+        ("/etc/passwd", False),
+    ],
+)
+def test_pattern_set(path, expected):
+    patterns = PatternSet(prefix=True)
+    patterns.add("/data/*/cache/**")
+    patterns.add("*.parquet")
+    patterns.add("/srv/log?.txt")
+
+    assert patterns.match(path) == expected
+
+
+def test_pattern_set_exact():
+    patterns = PatternSet()
+    patterns.add("/usr/bin/python3*")
+
+    assert patterns.match("/usr/bin/python3")
+    assert patterns.match("/usr/bin/python3.11")
+    assert not patterns.match("/usr/bin/python2")
+    assert not patterns.match("/usr/bin/python3.11/x")
+
+
+def test_pattern_set_brackets():
+    patterns = PatternSet()
+    patterns.add("/tmp/[!]")
+    patterns.add("/tmp/[")
+
+    assert patterns.match("/tmp/[!]")
+    assert patterns.match("/tmp/[")
+    assert not patterns.match("/tmp/a")
+
+
+def test_pattern_set_invalid():
+    patterns = PatternSet()
+
+    with pytest.raises(ValueError, match="Invalid pattern"):
+        patterns.add("/tmp/[z-a]")
+
+    assert not patterns.match("/tmp/z")
+
+
+def test_pattern_set_empty():
+    assert not PatternSet().match("/tmp")
+
+
+def test_escape_pattern():
+    patterns = PatternSet()
+    patterns.add(escape_pattern("/tmp/file[1]*.txt"))
+
+    assert is_pattern("/tmp/*")
+    assert not is_pattern("/tmp/file")
+    assert patterns.match("/tmp/file[1]*.txt")
+    assert not patterns.match("/tmp/file1a.txt")
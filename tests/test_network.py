@@ -1,8 +1,21 @@
+import hashlib
+import http.server
+import math
+import os
+import threading
 from unittest import mock
 
 import pytest
 
-from python_run.network import download_file, host2ip, is_ip_address
+from python_run.network import (
+    HostCache,
+    download_file,
+    fetch_remote_file,
+    get_host_ips,
+    host2ip,
+    is_ip_address,
+    resolve_hosts,
+)
 
 
 @pytest.mark.parametrize(
@@ -37,3 +50,227 @@ def test_download_file():
 
     with mock.patch("urllib.request.urlopen", return_value=open_mock):
         assert download_file("https://example.com") == b"hello"
+
+
+def test_host_cache():
+    cache = HostCache()
+
+    cache.add("151.101.1.69", "stackoverflow.com")
+    cache.add("151.101.1.69", "pypi.org")
+    cache.add("151.101.1.69", "pypi.org")
+
+    assert "151.101.1.69" in cache
+    assert "127.0.0.1" not in cache
+    assert cache.get("151.101.1.69") == {"stackoverflow.com", "pypi.org"}
+    assert cache.get("127.0.0.1") == set()
+
+
+def test_host_cache_maxsize():
+    cache = HostCache(maxsize=2)
+
+    cache.add("10.0.0.1", "a.com")
+    cache.add("10.0.0.2", "b.com")
+    cache.add("10.0.0.1", "c.com")
+    cache.add("10.0.0.3", "d.com")
+
+    assert len(cache) == 2
+    assert cache.get("10.0.0.1") == {"a.com", "c.com"}
+    assert "10.0.0.2" not in cache
+
+
+def test_host_cache_maxsize_pinned():
+    cache = HostCache(maxsize=2)
+
+    cache.add("10.0.0.1", "a.com", ttl=math.inf)
+    cache.add("10.0.0.2", "b.com")
+    cache.add("10.0.0.3", "c.com")
+    cache.add("10.0.0.4", "d.com")
+
+    assert len(cache) == 2
+    assert cache.get("10.0.0.1") == {"a.com"}
+    assert "10.0.0.4" in cache
+
+
+def test_host_cache_ttl():
+    cache = HostCache(ttl=10)
+
+    with mock.patch("time.monotonic", return_value=100):
+        cache.add("10.0.0.1", "a.com")
+        cache.add("10.0.0.1", "b.com", ttl=60)
+
+    with mock.patch("time.monotonic", return_value=120):
+        assert cache.get("10.0.0.1") == {"b.com"}
+
+    with mock.patch("time.monotonic", return_value=160):
+        assert "10.0.0.1" not in cache
+        assert len(cache) == 0
+
+
+def test_host_cache_clear():
+    cache = HostCache()
+
+    cache.add("10.0.0.1", "a.com")
+    cache.clear()
+
+    assert len(cache) == 0
+
+
+def test_get_host_ips():
+    assert get_host_ips("127.0.0.1") == {"127.0.0.1"}
+    assert get_host_ips("") == set()
+
+
+def test_resolve_hosts():
+    cache = HostCache(ttl=10)
+
+    addresses = {
+        "a.com": {"10.0.0.1", "10.0.0.2"},
+        "b.com": {"10.0.0.2"},
+        "c.com": set(),
+    }
+
+    with mock.patch("time.monotonic", return_value=100):
+        results = resolve_hosts(
+            ["a.com", "b.com", "c.com", "a.com"],
+            timeout=5,
+            resolver=addresses.__getitem__,
+            cache=cache,
+            max_workers=2,
+        )
+
+    assert results == addresses
+
+    # Addresses resolved at startup don't expire
+    with mock.patch("time.monotonic", return_value=1000):
+        assert cache.get("10.0.0.1") == {"a.com"}
+        assert cache.get("10.0.0.2") == {"a.com", "b.com"}
+
+
+def test_resolve_hosts_timeout():
+    cache = HostCache()
+    release = threading.Event()
+
+    def resolver(host):
+        if host == "slow.com":
+            release.wait()
+        return {"10.0.0.1" if host == "slow.com" else "10.0.0.2"}
+
+    results = resolve_hosts(
+        ["slow.com", "fast.com"], timeout=0.1, resolver=resolver, cache=cache
+    )
+
+    assert results == {"fast.com": {"10.0.0.2"}}
+    assert "10.0.0.1" not in cache
+
+    release.set()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    body = b"print('hello')\n"
+    etag = '"v1"'
+    requests: list[dict[str, str]] = []
+
+    def do_GET(self):
+        self.requests.append(dict(self.headers))
+
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _Handler.requests = []
+
+    with http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler) as httpd:
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.start()
+
+        yield f"http://127.0.0.1:{httpd.server_port}"
+
+        httpd.shutdown()
+        thread.join()
+
+
+def test_fetch_remote_file(server, tmp_path):
+    url = f"{server}/job.py"
+
+    file = fetch_remote_file(url, str(tmp_path))
+
+    with open(file, "rb") as fp:
+        assert fp.read() == _Handler.body
+
+    assert os.path.basename(file) == hashlib.sha256(_Handler.body).hexdigest() + ".py"
+
+    # Cached, no request
+    assert fetch_remote_file(url, str(tmp_path)) == file
+    assert len(_Handler.requests) == 1
+
+    # Revalidated with the ETag
+    assert fetch_remote_file(url, str(tmp_path), reload=True) == file
+    assert len(_Handler.requests) == 2
+    assert _Handler.requests[1]["If-None-Match"] == '"v1"'
+
+
+def test_fetch_remote_file_changed(server, tmp_path):
+    url = f"{server}/job.py"
+
+    old = fetch_remote_file(url, str(tmp_path))
+
+    with mock.patch.object(_Handler, "body", b"print('world')\n"), mock.patch.object(
+        _Handler, "etag", '"v2"'
+    ):
+        new = fetch_remote_file(url, str(tmp_path), reload=True)
+
+    assert new != old
+
+    with open(new, "rb") as fp:
+        assert fp.read() == b"print('world')\n"
+
+
+def test_fetch_remote_file_offline(server, tmp_path):
+    url = f"{server}/job.py"
+
+    with pytest.raises(FileNotFoundError):
+        fetch_remote_file(url, str(tmp_path), offline=True)
+
+    file = fetch_remote_file(url, str(tmp_path))
+
+    assert fetch_remote_file(url, str(tmp_path), reload=True, offline=True) == file
+    assert len(_Handler.requests) == 1
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        "[]",
+        "{}",
+        '{"url": "x"}',
+        '{"sha256": 1}',
+        '{"sha256": "../../job"}',
+        '{"sha256": "%s", "etag": null}' % ("0" * 64),
+        '{"sha256": "abc',
+    ],
+)
+def test_fetch_remote_file_corrupt_index(server, tmp_path, data):
+    url = f"{server}/job.py"
+
+    file = fetch_remote_file(url, str(tmp_path))
+
+    (index,) = (tmp_path / "remote" / "urls").iterdir()
+    index.write_text(data)
+
+    # Fetched again, as if it was not in the cache
+    assert fetch_remote_file(url, str(tmp_path)) == file
+    assert len(_Handler.requests) == 2
+    assert "If-None-Match" not in _Handler.requests[1]
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from python_run.paths import PathResolver, get_dir_fd_path, get_open_access
+
+
+@pytest.mark.parametrize(
+    "mode, flags, expected",
+    [
+        ("r", os.O_RDONLY, (True, False)),
+        ("w", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, (False, True)),
+        ("a", os.O_WRONLY | os.O_CREAT | os.O_APPEND, (False, True)),
+        ("x", os.O_WRONLY | os.O_CREAT | os.O_EXCL, (False, True)),
+        ("r+", os.O_RDWR, (True, True)),
+        (None, os.O_RDONLY | os.O_CREAT, (True, True)),
+        (None, os.O_RDONLY, (True, False)),
+        ("r", None, (True, False)),
+        ("rb+", None, (True, True)),
+        ("xb", None, (False, True)),
+        ("w", None, (False, True)),
+        (None, None, (False, False)),
+    ],
+)
+def test_get_open_access(mode, flags, expected):
+    assert get_open_access(mode, flags) == expected
+
+
+def test_path_resolver(tmp_path):
+    tmp_path = tmp_path.resolve()
+
+    real = tmp_path / "real"
+    real.mkdir()
+    (real / "file").touch()
+    (tmp_path / "link").symlink_to(real)
+    (real / "file-link").symlink_to(real / "file")
+
+    resolver = PathResolver()
+
+    assert resolver.realpath(str(real / "file")) == str(real / "file")
+    assert resolver.realpath(str(tmp_path / "link" / "file")) == str(real / "file")
+    assert resolver.realpath(tmp_path / "link" / "file-link") == str(real / "file")
+    assert resolver.realpath(os.fsencode(real / "file")) == str(real / "file")
+    assert resolver.realpath(str(tmp_path / "link" / ".." / "real")) == str(
+        real.parent / "real"
+    )
+    assert resolver.realpath(str(tmp_path / "link" / "missing")) == str(
+        real / "missing"
+    )
+
+    assert len(resolver) == 2
+
+    resolver.clear()
+    assert len(resolver) == 0
+
+
+def test_path_resolver_cache(tmp_path):
+    tmp_path = tmp_path.resolve()
+
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+
+    resolver = PathResolver()
+
+    assert resolver.realpath(str(tmp_path / "a" / "file")) == str(
+        tmp_path / "a" / "file"
+    )
+
+    (tmp_path / "a").rmdir()
+    (tmp_path / "a").symlink_to(tmp_path / "b")
+
+    # Until the cache is cleared by the hook
+    assert resolver.realpath(str(tmp_path / "a" / "file")) == str(
+        tmp_path / "a" / "file"
+    )
+
+    resolver.clear()
+
+    assert resolver.realpath(str(tmp_path / "a" / "file")) == str(
+        tmp_path / "b" / "file"
+    )
+
+
+def test_path_resolver_maxsize(tmp_path):
+    resolver = PathResolver(maxsize=2)
+
+    for i in range(3):
+        resolver.realpath(str(tmp_path / str(i) / "file"))
+
+    assert len(resolver) <= 2
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="requires procfs")
+def test_get_dir_fd_path(tmp_path):
+    tmp_path = tmp_path.resolve()
+
+    fd = os.open(tmp_path, os.O_RDONLY)
+
+    try:
+        assert get_dir_fd_path(fd, "file") == str(tmp_path / "file")
+    finally:
+        os.close(fd)
@@ -1,4 +1,13 @@
-from python_run.permission import Permission, PermissionAll, PermissionName, Permissions
+from unittest import mock
+
+from python_run.network import HostCache
+from python_run.permission import (
+    CacheInfo,
+    Permission,
+    PermissionAll,
+    PermissionName,
+    Permissions,
+)
 
 
 def test_permissons():
@@ -65,3 +74,173 @@ def test_permissions_allow():
     assert permissions.check(Permission(PermissionName.READ, "/etc/passwd"))
     assert permissions.check(Permission(PermissionName.WRITE, "/etc/passwd"))
     assert permissions.check(Permission(PermissionName.RUN, "/bin/ls"))
+
+
+def test_permissions_read_write_prefix():
+    permissions = Permissions()
+
+    permissions.allow_read("/tmp")
+    permissions.allow_write("/var/log/")
+
+    assert permissions.check_read("/tmp")
+    assert permissions.check_read("/tmp/dir/file")
+    assert not permissions.check_read("/tmpfoo")
+    assert not permissions.check_write("/tmp/file")
+
+    assert permissions.check_write("/var/log/app.log")
+    assert not permissions.check_write("/var/logs")
+    assert not permissions.check_read("/var/log/app.log")
+
+
+def test_permissions_cache():
+    permissions = Permissions()
+
+    permissions.allow_read("/tmp")
+
+    assert permissions.check(Permission(PermissionName.READ, "/tmp/file"))
+    assert permissions.check(Permission(PermissionName.READ, "/tmp/file"))
+    assert not permissions.check(Permission(PermissionName.READ, "/etc/passwd"))
+    assert not permissions.check(Permission(PermissionName.READ, "/etc/passwd"))
+
+    assert permissions.cache_info() == CacheInfo(2, 2, 4096, 2)
+
+
+def test_permissions_cache_invalidated_by_allow():
+    permissions = Permissions()
+
+    assert not permissions.check(Permission(PermissionName.ENV, "FOO"))
+
+    permissions.allow(Permission(PermissionName.ENV, "FOO"))
+
+    assert permissions.check(Permission(PermissionName.ENV, "FOO"))
+    assert permissions.cache_info().hits == 0
+
+
+def test_permissions_cache_bounded():
+    permissions = Permissions(cache_size=2)
+
+    permissions.allow_env(PermissionAll)
+
+    for i in ["A", "B", "A", "C"]:
+        permissions.check(Permission(PermissionName.ENV, i))
+
+    assert permissions.cache_info() == CacheInfo(1, 3, 2, 2)
+    assert permissions.check(Permission(PermissionName.ENV, "A"))
+    assert permissions.cache_info().hits == 2
+
+
+def test_permissions_cache_net_denied():
+    permissions = Permissions()
+
+    assert not permissions.check(Permission(PermissionName.NET, "127.0.0.1:80"))
+    assert permissions.cache_info().currsize == 0
+
+
+def test_permissions_net_cidr():
+    permissions = Permissions()
+
+    permissions.allow_net("10.0.0.0/8")
+    permissions.allow_net("[fd00::]/8:443")
+
+    assert permissions.check_net("10.20.30.40:80")
+    assert not permissions.check_net("11.0.0.1:80")
+    assert permissions.check_net("[fd00::1]:443")
+    assert not permissions.check_net("[fd00::1]:80")
+
+
+def test_permissions_net_reverse_host():
+    permissions = Permissions()
+
+    permissions.allow_net("example.com")
+    permissions.allow_net("api.example.org:443")
+
+    cache = HostCache()
+    cache.add("93.184.216.34", "www.example.com")
+    cache.add("93.184.216.35", "cdn.example.net")
+    cache.add("93.184.216.35", "api.example.org")
+
+    with mock.patch("python_run.permission.ip2host_cache", cache):
+        assert permissions.check_net("93.184.216.34:80")
+        assert permissions.check_net("93.184.216.35:443")
+        assert not permissions.check_net("93.184.216.35:80")
+        assert not permissions.check_net("93.184.216.36:80")
+
+
+def test_permissions_cache_net_reverse_host_expired():
+    permissions = Permissions()
+    permissions.allow_net("example.com")
+
+    cache = HostCache()
+    permission = Permission(PermissionName.NET, "93.184.216.34:443")
+
+    with mock.patch("python_run.permission.ip2host_cache", cache), mock.patch(
+        "time.monotonic", return_value=0
+    ):
+        cache.add("93.184.216.34", "www.example.com", ttl=10)
+        assert permissions.check(permission)
+
+    with mock.patch("python_run.permission.ip2host_cache", cache), mock.patch(
+        "time.monotonic", return_value=20
+    ):
+        assert not permissions.check(permission)
+
+    assert permissions.cache_info().currsize == 0
+
+
+def test_permissions_patterns():
+    permissions = Permissions()
+
+    permissions.allow_read("/data/*/cache/**")
+    permissions.allow_read("*.parquet")
+    permissions.allow_write("/tmp")
+    permissions.allow_run("/usr/bin/python3*")
+
+    assert permissions.check_read("/data/a/cache/file")
+    assert not permissions.check_read("/data/a/file")
+    assert permissions.check_read("/home/user/table.parquet")
+    assert not permissions.check_write("/home/user/table.parquet")
+    assert permissions.check_write("/tmp/file")
+    assert permissions.check_run("/usr/bin/python3.11")
+    assert not permissions.check_run("/usr/bin/python2")
+
+
+def test_permissions_literal():
+    permissions = Permissions()
+
+    permissions.allow(Permission(PermissionName.READ, "/tmp/file[1].txt").literal())
+
+    assert permissions.check_read("/tmp/file[1].txt")
+    assert not permissions.check_read("/tmp/file1.txt")
+
+    assert Permission(PermissionName.NET, "[::1]:80").literal().value == "[::1]:80"
+
+
+def test_permissions_patterns_state():
+    permissions = Permissions()
+    permissions.allow_read("*.csv")
+
+    copy = Permissions.__new__(Permissions)
+    copy.__setstate__(permissions.__getstate__())
+
+    assert copy.check_read("/data/file.csv")
+
+
+def test_permissions_env_patterns():
+    permissions = Permissions()
+
+    permissions.allow_env("AWS_*")
+
+    assert permissions.check_env("AWS_REGION")
+    assert not permissions.check_env("HOME")
+
+
+def test_permissions_net_hosts():
+    permissions = Permissions()
+
+    permissions.allow_net("github.com:443")
+    permissions.allow_net("pypi.org")
+    permissions.allow_net("127.0.0.1")
+    permissions.allow_net("10.0.0.0/8")
+    permissions.allow_net("[::1]:80")
+
+    assert permissions.net_hosts() == ["github.com", "pypi.org"]
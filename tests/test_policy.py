@@ -0,0 +1,130 @@
+import json
+import marshal
+import sys
+
+import pytest
+
+from python_run.permission import Permissions
+from python_run.policy import (
+    SNAPSHOT_MAGIC,
+    dump_snapshot,
+    load_policy,
+    load_snapshot,
+    main,
+)
+
+POLICY = """
+[allow]
+env = ["HOME"]
+net = ["github.com", "10.0.0.0/8"]
+read = ["data", "/etc/hosts"]
+write = false
+run = true
+"""
+
+
+def check(permissions: Permissions, base_dir: str) -> None:
+    assert permissions.check_env("HOME")
+    assert not permissions.check_env("PATH")
+    assert permissions.check_net("github.com:443")
+    assert permissions.check_net("10.1.2.3:80")
+    assert permissions.check_read(f"{base_dir}/data/file.csv")
+    assert permissions.check_read("/etc/hosts")
+    assert not permissions.check_read("/etc/passwd")
+    assert not permissions.check_write("/tmp/file")
+    assert permissions.check_run("/bin/ls")
+
+
+def test_load_policy_toml(tmp_path):
+    file = tmp_path / "policy.toml"
+    file.write_text(POLICY)
+
+    check(load_policy(str(file)), str(tmp_path))
+
+
+def test_load_policy_json(tmp_path):
+    file = tmp_path / "policy.json"
+    file.write_text(
+        json.dumps(
+            {
+                "allow": {
+                    "env": ["HOME"],
+                    "net": ["github.com", "10.0.0.0/8"],
+                    "read": ["data", "/etc/hosts"],
+                    "run": True,
+                }
+            }
+        )
+    )
+
+    check(load_policy(str(file)), str(tmp_path))
+
+
+def test_load_policy_all(tmp_path):
+    file = tmp_path / "policy.json"
+    file.write_text('{"allow": {"all": true}}')
+
+    permissions = load_policy(str(file))
+
+    assert permissions.check_write("/etc/passwd")
+    assert permissions.check_net("example.com:80")
+
+
+@pytest.mark.parametrize(
+    "policy",
+    [
+        '{"allow": []}',
+        '{"allow": {"disk": true}}',
+        '{"allow": {"read": "/tmp"}}',
+        '{"allow": {"read": [1]}}',
+    ],
+)
+def test_load_policy_invalid(tmp_path, policy):
+    file = tmp_path / "policy.json"
+    file.write_text(policy)
+
+    with pytest.raises(ValueError):
+        load_policy(str(file))
+
+
+def test_snapshot(tmp_path):
+    file = tmp_path / "policy.toml"
+    file.write_text(POLICY)
+
+    snapshot = tmp_path / "policy.snap"
+    snapshot.write_bytes(dump_snapshot(load_policy(str(file))))
+
+    check(load_policy(str(snapshot)), str(tmp_path))
+
+
+def test_snapshot_invalid():
+    snapshot = dump_snapshot(Permissions())
+
+    with pytest.raises(ValueError, match="another version"):
+        load_snapshot(b"PYRUNPOL\x01\x02\x07" + snapshot[len(SNAPSHOT_MAGIC) :])
+
+    with pytest.raises(ValueError, match="Corrupted"):
+        load_snapshot(snapshot[:-3])
+
+    # Well-formed marshal data, but not the state of `Permissions`
+    for state in [{}, {"cache_size": 1, "permissions": 1}, [1, 2]]:
+        with pytest.raises(ValueError, match="Corrupted"):
+            load_snapshot(SNAPSHOT_MAGIC + marshal.dumps(state))
+
+
+def test_main(tmp_path):
+    file = tmp_path / "policy.toml"
+    file.write_text(POLICY)
+
+    sys.argv = ["policy", str(file), str(tmp_path / "policy.snap")]
+
+    main()
+
+    check(load_policy(str(tmp_path / "policy.snap")), str(tmp_path))
+
+
+def test_main_error(tmp_path):
+    sys.argv = ["policy", str(tmp_path / "missing.toml"), str(tmp_path / "out")]
+
+    with pytest.raises(SystemExit, match="Cannot load policy"):
+        main()
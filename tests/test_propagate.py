@@ -0,0 +1,257 @@
+import os
+import subprocess
+import sys
+import textwrap
+from unittest import mock
+
+import pytest
+
+from python_run.hook import Hook, HookExit
+from python_run.permission import Permission, PermissionName, Permissions
+from python_run.policy import load_snapshot
+from python_run.propagate import (
+    BOOTSTRAP_DIR,
+    ENV_FILE,
+    ENV_POLICY,
+    PolicyFile,
+    propagate,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def restore_environ():
+    with mock.patch.dict(os.environ):
+        yield
+
+
+def read_policy(path: str) -> Permissions:
+    with open(path, "rb") as fp:
+        return load_snapshot(fp.read())
+
+
+def test_policy_file(tmp_path):
+    permissions = Permissions()
+    permissions.allow_read("/tmp")
+
+    policy_file = PolicyFile(str(tmp_path / "policy"))
+    policy_file.write(permissions)
+
+    loaded = read_policy(policy_file.path)
+    assert loaded.check(Permission(PermissionName.READ, "/tmp/a"))
+    assert not loaded.check(Permission(PermissionName.READ, "/etc/passwd"))
+
+    permissions.allow_read("/etc")
+    policy_file.write(permissions)
+
+    assert read_policy(policy_file.path).check(
+        Permission(PermissionName.READ, "/etc/passwd")
+    )
+    assert os.listdir(tmp_path) == ["policy"]
+
+
+def test_propagate(restore_environ):
+    os.environ["PYTHONPATH"] = "/opt/lib"
+    os.environ.pop("PYTHON_RUN_BROKER", None)
+
+    permissions = Permissions()
+    permissions.allow_net("example.com")
+
+    policy_file = propagate("script.py", permissions)
+
+    assert os.environ[ENV_POLICY] == policy_file.path
+    assert os.environ[ENV_FILE] == "script.py"
+    assert os.environ["PYTHONPATH"] == os.pathsep.join(
+        [BOOTSTRAP_DIR, ROOT, "/opt/lib"]
+    )
+    assert "PYTHON_RUN_BROKER" not in os.environ
+    assert read_policy(policy_file.path).check(
+        Permission(PermissionName.NET, "example.com")
+    )
+
+    policy_file.remove()
+    assert not os.path.exists(os.path.dirname(policy_file.path))
+
+    policy_file = propagate("script.py", permissions, "/tmp/broker.sock")
+    policy_file.remove()
+
+    assert os.environ["PYTHON_RUN_BROKER"] == "/tmp/broker.sock"
+
+
+def test_hook_writes_granted(tmp_path):
+    policy_file = PolicyFile(str(tmp_path / "policy"))
+    policy_file.write(Permissions())
+
+    broker = mock.Mock()
+    broker.request.return_value = True
+
+    hook = Hook("", Permissions(), broker=broker, policy_file=policy_file)
+
+    assert hook("os.getenv", ("HOME",)) == HookExit.PERMISSION_GRANTED
+    assert read_policy(policy_file.path).check(Permission(PermissionName.ENV, "HOME"))
+
+
+def test_hook_policy_dir(tmp_path):
+    policy_file = PolicyFile(str(tmp_path / "policy"))
+    policy_file.write(Permissions())
+
+    permissions = Permissions()
+    permissions.allow_read(str(tmp_path))
+    permissions.allow_write(str(tmp_path))
+
+    hook = Hook("", permissions, policy_file=policy_file)
+
+    for event, args in [
+        ("open", (policy_file.path, "w", None)),
+        ("open", (str(tmp_path / "other"), "w", None)),
+        ("os.rename", (str(tmp_path / "a"), policy_file.path, -1, -1)),
+        ("os.symlink", ("/tmp", str(tmp_path), -1)),
+        ("os.remove", (policy_file.path, -1)),
+        ("os.rmdir", (str(tmp_path), -1)),
+    ]:
+        with pytest.raises(SystemExit):
+            hook(event, args)
+
+    fd = os.open(tmp_path, os.O_RDONLY)
+
+    try:
+        with pytest.raises(SystemExit):
+            hook("os.remove", ("policy", fd))
+    finally:
+        os.close(fd)
+
+    assert hook("open", (policy_file.path, "r", None)) == HookExit.PERMISSION_OK
+    assert hook("os.remove", ("/tmp/other", -1)) is None
+
+
+def test_hook_remove_policy_file(tmp_path):
+    dir = tmp_path / "policy"
+    dir.mkdir()
+
+    policy_file = PolicyFile(str(dir / "policy"))
+    policy_file.write(Permissions())
+
+    hook = Hook("", Permissions(), policy_file=policy_file)
+
+    # `shutil.rmtree` raises the events the script would
+    sys.addaudithook(
+        lambda event, args: hook(event, args) if hook is not None else None
+    )
+
+    try:
+        hook.remove_policy_file()
+    finally:
+        hook = None
+
+    assert not dir.exists()
+
+
+def test_hook_policy_file_read_only(tmp_path):
+    policy_file = PolicyFile(str(tmp_path / "policy"), read_only=True)
+    policy_file.write(Permissions())
+
+    broker = mock.Mock()
+    broker.request.return_value = True
+
+    hook = Hook("", Permissions(), broker=broker, policy_file=policy_file)
+
+    assert hook("os.getenv", ("HOME",)) == HookExit.PERMISSION_GRANTED
+    assert not read_policy(policy_file.path).check(
+        Permission(PermissionName.ENV, "HOME")
+    )
+
+
+SCRIPT = """
+import subprocess
+import sys
+
+def run(path):
+    code = f"open({{path!r}}).close(); print('ok')"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True)
+
+    return "ok" if result.returncode == 0 else "denied"
+
+print(run({allowed!r}), run({denied!r}))
+"""
+
+
+def test_propagate_child(tmp_path):
+    allowed = tmp_path / "allowed"
+    allowed.mkdir()
+    (allowed / "file").write_text("")
+
+    denied = tmp_path / "denied"
+    denied.mkdir()
+    (denied / "file").write_text("")
+
+    script = tmp_path / "script.py"
+    script.write_text(
+        textwrap.dedent(SCRIPT).format(
+            allowed=str(allowed / "file"), denied=str(denied / "file")
+        )
+    )
+
+    def run(*args: str) -> str:
+        return subprocess.check_output(
+            [
+                sys.executable,
+                "-m",
+                "python_run",
+                str(script),
+                "--allow-run",
+                "--allow-env",
+                f"--allow-read={allowed}",
+                *args,
+            ],
+            cwd=ROOT,
+            env={**os.environ, "PYTHON_NO_PROMPT": "1"},
+            text=True,
+        )
+
+    assert run().split() == ["ok", "ok"]
+    assert run("--propagate").split() == ["ok", "denied"]
+
+
+CUSTOMIZE_SCRIPT = """
+import os
+import subprocess
+import sys
+
+env = {{**os.environ}}
+env["PYTHONPATH"] += os.pathsep + {site!r}
+
+result = subprocess.run([sys.executable, "-c", "print('ok')"], env=env)
+print("ok" if result.returncode == 0 else "denied")
+"""
+
+
+def test_propagate_child_sitecustomize(tmp_path):
+    denied = tmp_path / "denied"
+    denied.write_text("")
+
+    site = tmp_path / "site"
+    site.mkdir()
+    (site / "sitecustomize.py").write_text(f"open({str(denied)!r}).close()\n")
+
+    script = tmp_path / "script.py"
+    script.write_text(textwrap.dedent(CUSTOMIZE_SCRIPT).format(site=str(site)))
+
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-m",
+            "python_run",
+            str(script),
+            "--allow-run",
+            "--allow-env",
+            f"--allow-read={site}",
+            "--propagate",
+        ],
+        cwd=ROOT,
+        env={**os.environ, "PYTHON_NO_PROMPT": "1"},
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+
+    assert output.split() == ["denied"]
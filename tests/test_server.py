@@ -0,0 +1,124 @@
+import os
+import socket
+import stat
+import subprocess
+import sys
+import time
+from unittest import mock
+
+import pytest
+
+from python_run import client
+from python_run.server import _exit_code, serve
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "server.sock")
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "python_run.server", path, "--workers", "2"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+    yield path
+
+    process.terminate()
+    process.wait()
+
+    assert not os.path.exists(path)
+
+
+def run(path, argv):
+    with open(os.devnull, "rb") as devnull:
+        read_out, write_out = os.pipe()
+        read_err, write_err = os.pipe()
+
+        code = client.run(path, argv, (devnull.fileno(), write_out, write_err))
+
+        os.close(write_out)
+        os.close(write_err)
+
+        with open(read_out) as out, open(read_err) as err:
+            return code, out.read(), err.read()
+
+
+def test_server(server, tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text("import os, sys\nprint(sys.argv[2:], os.getcwd())\n")
+
+    for _ in range(5):
+        assert run(server, [str(script), "a", "b"]) == (
+            0,
+            f"['a', 'b'] {os.getcwd()}\n",
+            "",
+        )
+
+
+def test_server_permission_denied(server, tmp_path, monkeypatch):
+    script = tmp_path / "script.py"
+    script.write_text("open('/etc/hostname')\n")
+
+    monkeypatch.setenv("PYTHON_NO_PROMPT", "1")
+
+    code, _, err = run(server, [str(script)])
+
+    assert code == 1
+    assert "Requires read access to '/etc/hostname'" in err
+
+    assert run(server, [str(script), "--allow-read"])[0] == 0
+
+
+def test_server_exception(server, tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text("import sys\nsys.exit(3)\n")
+
+    assert run(server, [str(script)])[0] == 3
+
+    script.write_text("raise ValueError('oops')\n")
+
+    # Printing the traceback reads the script
+    code, _, err = run(server, [str(script), "--allow-read"])
+
+    assert code == 1
+    assert "ValueError: oops" in err
+
+
+def test_server_socket_mode(tmp_path):
+    path = tmp_path / "server.sock"
+    bind = socket.socket.bind
+    modes = []
+
+    def bind_and_stat(self, address):
+        bind(self, address)
+        modes.append(stat.S_IMODE(path.stat().st_mode))
+
+    umask = os.umask(0)
+
+    try:
+        with mock.patch("socket.socket.bind", bind_and_stat), mock.patch(
+            "socket.socket.listen", side_effect=OSError
+        ), pytest.raises(OSError):
+            serve(str(path), 1)
+
+        # Restored after `bind`
+        assert os.umask(0) == 0
+    finally:
+        os.umask(umask)
+
+    assert modes == [0o600]
+
+
+@pytest.mark.parametrize("code, expected", [(None, 0), (0, 0), (2, 2), ("error", 1)])
+def test_exit_code(code, expected, capsys):
+    assert _exit_code(SystemExit(code)) == expected
+
+
+def test_client_usage():
+    sys.argv = ["client", "server.sock"]
+
+    with pytest.raises(SystemExit, match="usage"):
+        client.main()
@@ -0,0 +1,76 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time of python_run, can be raised on slow machines
+BUDGET_MS = float(os.environ.get("PYTHON_RUN_IMPORT_BUDGET_MS", "50"))
+
+# Modules that only optional features need
+LAZY_MODULES = [
+    "urllib.request",
+    "http.client",
+    "socket",
+    "socketserver",
+    "json",
+    "tomllib",
+    "hashlib",
+    "resource",
+    "tempfile",
+    "python_run.audit_log",
+    "python_run.broker",
+    "python_run.bytecode",
+    "python_run.embed",
+    "python_run.learn",
+    "python_run.limits",
+    "python_run.policy",
+    "python_run.propagate",
+    "python_run.stats",
+    "python_run.trace",
+]
+
+
+def import_times() -> dict[str, int]:
+    # Returns the cumulative import time (us) of each top-level import
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import python_run.__main__"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    times = {}
+
+    for line in out.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+
+        if match:
+            cumulative, indent, name = match.groups()
+            times[name] = int(cumulative) if not indent else times.get(name, 0)
+
+    return times
+
+
+def test_lazy_imports():
+    times = import_times()
+
+    assert "python_run.__main__" in times
+
+    for name in LAZY_MODULES:
+        assert name not in times, f"{name} is imported at startup"
+
+
+def test_import_time_budget():
+    # Best of a few runs, to not fail because of a noisy machine
+    best = min(
+        sum(v for k, v in import_times().items() if k.startswith("python_run"))
+        for _ in range(3)
+    )
+
+    if best / 1000 > BUDGET_MS:
+        pytest.fail(f"python_run takes {best / 1000:.1f} ms to import")
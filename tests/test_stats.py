@@ -0,0 +1,62 @@
+import io
+import json
+from unittest import mock
+
+import pytest
+
+from python_run.hook import HookExit
+from python_run.permission import Permissions
+from python_run.stats import StatsHook
+
+
+def make_hook() -> StatsHook:
+    permissions = Permissions()
+    permissions.allow_read("/tmp")
+
+    hook = StatsHook("", permissions)
+    hook("exec", (None,))
+    hook("open", ("/tmp/file", "r", None))
+    hook("open", ("/tmp/file", "r", None))
+
+    with mock.patch.object(hook, "_prompt", return_value=True):
+        assert hook("os.getenv", ("HOME",)) is HookExit.PERMISSION_GRANTED
+
+    with mock.patch.object(hook, "_prompt", return_value=False):
+        with pytest.raises(SystemExit):
+            hook("os.getenv", ("PATH",))
+
+    return hook
+
+
+def test_stats_hook():
+    stats = make_hook().stats()
+
+    assert stats["events"] == {"open": 2, "os.getenv": 2, "exec": 1}
+    assert stats["handled"] == 4
+    assert stats["checks"] == {"env": 2, "read": 2}
+    assert stats["asked"] == 2
+    assert stats["denied"] == 1
+    assert stats["cache"] == {"hits": 1, "misses": 3, "maxsize": 4096, "currsize": 1}
+    assert 0 < stats["hook_time"] <= stats["wall_time"]
+
+
+def test_stats_hook_report(capsys):
+    hook = make_hook()
+    hook.report()
+
+    table = capsys.readouterr().err
+
+    assert table.startswith("python_run stats\n")
+    assert "checks         env 2, read 2" in table
+    assert "asked          2 (1 denied)" in table
+    assert "      2  open" in table
+
+
+def test_stats_hook_report_json():
+    file = io.StringIO()
+    file.close = mock.Mock()
+
+    make_hook().report(file)
+
+    assert json.loads(file.getvalue())["events"]["open"] == 2
+    file.close.assert_called_once()
@@ -0,0 +1,62 @@
+import io
+from unittest import mock
+
+import pytest
+
+from python_run.hook import Hook
+from python_run.permission import Permission, PermissionName, Permissions
+from python_run.trace import Tracer
+
+
+def test_tracer():
+    file = io.StringIO()
+    file.close = mock.Mock()
+
+    tracer = Tracer(file, name="test")
+    tracer.add("open", 1000, 3000, Permission(PermissionName.READ, "/tmp"), "OK")
+    tracer.add("import", 1000, 2000, None, "IMPORT")
+
+    tracer.dump()
+
+    metadata, open_, import_ = tracer.to_json()["traceEvents"]
+
+    assert metadata["ph"] == "M"
+    assert metadata["args"] == {"name": "test"}
+
+    assert open_["name"] == "open"
+    assert open_["ph"] == "X"
+    assert open_["dur"] == 2
+    assert open_["args"] == {"verdict": "OK", "permission": "read", "value": "/tmp"}
+
+    assert import_["args"] == {"verdict": "IMPORT"}
+
+    assert '"traceEvents"' in file.getvalue()
+    file.close.assert_called_once()
+
+
+def test_hook_trace():
+    tracer = Tracer(io.StringIO())
+
+    permissions = Permissions()
+    permissions.allow_read("/tmp")
+
+    hook = Hook("", permissions, tracer)
+    hook("exec", (None,))
+    hook("import", ("os",))
+    hook("open", ("/tmp/file", "r", None))
+    hook("open", ("/tmp/file", "r", None))
+
+    with mock.patch.object(hook, "_prompt", return_value=False):
+        with pytest.raises(SystemExit):
+            hook("open", ("/etc/passwd", "r", None))
+
+    _, *events = tracer.to_json()["traceEvents"]
+
+    assert [(i["name"], i["args"]["verdict"]) for i in events] == [
+        ("import", "IMPORT"),
+        ("open", "OPEN_IMPORT"),
+        ("open", "PERMISSION_OK"),
+        ("open", "PERMISSION_DENIED"),
+    ]
+    assert events[2]["args"]["permission"] == "read"
+    assert events[3]["args"]["value"] == "/etc/passwd"
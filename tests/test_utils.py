@@ -6,9 +6,12 @@ import pytest
 from python_run.utils import (
     bold,
     clear_lines,
+    format_size,
+    get_cache_dir,
     is_env_set,
     italic,
     parse_address,
+    parse_size,
     split_string,
 )
 
@@ -26,6 +29,10 @@ from python_run.utils import (
             "[b5f3:09b0:a6cc:1d08:4349:c382:d7f9:7402]",
             ("b5f3:09b0:a6cc:1d08:4349:c382:d7f9:7402", None),
         ),
+        ("10.0.0.0/8", ("10.0.0.0/8", None)),
+        ("10.0.0.0/8:443", ("10.0.0.0/8", 443)),
+        ("[fd00::]/8", ("fd00::/8", None)),
+        ("[fd00::]/8:443", ("fd00::/8", 443)),
     ],
 )
 def test_parse_address(address, expected):
@@ -58,3 +65,41 @@ def test_clear_lines(capsys):
     out, _ = capsys.readouterr()
 
     assert out == "\033[1A\033[0J"
+
+
+def test_get_cache_dir():
+    with mock.patch.dict(os.environ, {"PYTHON_RUN_CACHE_DIR": "/cache"}):
+        assert get_cache_dir() == "/cache"
+
+    with mock.patch.dict(
+        os.environ, {"PYTHON_RUN_CACHE_DIR": "", "XDG_CACHE_HOME": "/xdg"}
+    ):
+        assert get_cache_dir() == "/xdg/python_run"
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("1048576", 1048576),
+        ("512K", 512 * 1024),
+        ("512m", 512 * 1024**2),
+        ("1.5G", 3 * 1024**3 // 2),
+        ("2GB", 2 * 1024**3),
+        ("2GiB", 2 * 1024**3),
+    ],
+)
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", "G", "-1M", "1X", "abc"])
+def test_parse_size_invalid(value):
+    with pytest.raises(ValueError):
+        parse_size(value)
+
+
+def test_format_size():
+    assert format_size(512) == "512 B"
+    assert format_size(1536) == "1.5 KiB"
+    assert format_size(2 * 1024**3) == "2.0 GiB"
+    assert format_size(3 * 1024**4) == "3.0 TiB"